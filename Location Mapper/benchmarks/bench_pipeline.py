@@ -0,0 +1,289 @@
+"""
+End-to-end throughput benchmark for the Location Mapper pipeline.
+
+Usage: python benchmarks/bench_pipeline.py [--tutors 100 10000] [--centres 10 1000] [--latency-ms 0] [--output results.json]
+
+Generates Singapore-like tutors and centres, then times each stage
+(normalize_postal_codes, haversine_km, geocoding cold and warm, matching
+with and without the float32 first pass, build_results, write_results) for every tutors x centres combination.
+Geocoding goes through a synthetic geocoder with a configurable delay
+(or any --geocoder spec, e.g. a mock_onemap.py URL), so nothing touches
+the internet. Results are printed (or written) as JSON so runs can be
+compared across releases.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance_engine import CentreMatcher  # noqa: E402
+from geocode_cache import GeocodeCache  # noqa: E402
+from geocoder_backends import make_geocoder  # noqa: E402
+from geocoding import LatencyStats, geocode_many  # noqa: E402
+from mock_onemap import LAT_RANGE, LON_RANGE, NOT_FOUND_SUFFIX, search_response  # noqa: E402
+from postal_validation import normalize_postal_codes  # noqa: E402
+from proximity_checker import (  # noqa: E402
+    build_results,
+    haversine_km,
+    lookup_codes,
+    match_centres,
+    tutors_from_rows,
+    write_results,
+)
+from workbook_io import CsvBook  # noqa: E402
+
+# Postal sectors are the first two digits; 74 is not in use.
+POSTAL_SECTORS = [sector for sector in range(1, 83) if sector != 74]
+
+
+class SyntheticGeocoder:
+    """In-process stand-in for OneMap that answers after a fixed delay."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.stats = LatencyStats()
+
+    def search(self, postal_code):
+        started = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        results = search_response(postal_code)["results"]
+        self.stats.record(time.perf_counter() - started, "found" if results else "not_found")
+        return results[0] if results else None
+
+    def reset_stats(self):
+        self.stats = LatencyStats()
+
+    def close(self):
+        pass
+
+
+def random_postal_codes(rng, count):
+    """Valid-looking 6-digit postal codes as strings."""
+    sectors = rng.choice(POSTAL_SECTORS, count)
+    suffixes = rng.integers(0, 10000, count)
+    return [f"{sector:02d}{suffix:04d}" for sector, suffix in zip(sectors, suffixes)]
+
+
+def generate_centres(rng, count):
+    lats = rng.uniform(*LAT_RANGE, count)
+    lons = rng.uniform(*LON_RANGE, count)
+    return [{"name": f"Centre {i}", "lat": float(lat), "lon": float(lon)} for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+def generate_tutor_rows(rng, count, unique_ratio, not_found_ratio):
+    """
+    Raw User Input rows (name, postal) drawn from a pool of postal codes.
+
+    Postal codes come in the messy forms Excel hands back: ints (leading
+    zero lost), floats, padded strings, plus some blanks and some codes
+    that the geocoder will not find.
+    """
+    pool = random_postal_codes(rng, max(1, int(count * unique_ratio)))
+    missing = int(len(pool) * not_found_ratio)
+    for i in range(missing):
+        pool[i] = pool[i][:-len(NOT_FOUND_SUFFIX)] + NOT_FOUND_SUFFIX
+
+    picks = rng.integers(0, len(pool), count)
+    forms = rng.integers(0, 20, count)
+    rows = []
+    for i, (pick, form) in enumerate(zip(picks, forms)):
+        postal = pool[pick]
+        if form < 8:
+            value = int(postal)
+        elif form < 11:
+            value = float(postal)
+        elif form < 13:
+            value = f" {postal} "
+        elif form == 13:
+            value = None
+        else:
+            value = postal
+        rows.append([f"Tutor {i}", value])
+    return rows
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageTimer:
+    """Collects seconds, rows/sec and (optionally) peak traced memory per stage."""
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            entry = {
+                "seconds": round(seconds, 6),
+                "rows": rows,
+                "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+            }
+            if self.trace_memory:
+                entry["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+                tracemalloc.stop()
+            self.stages[name] = entry
+
+
+def cache_stats(cache, hits_before, misses_before):
+    hits = cache.hits - hits_before
+    misses = cache.misses - misses_before
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None}
+
+
+def run_case(tutor_count, centre_count, args, rng, work_dir):
+    raw_rows = generate_tutor_rows(rng, tutor_count, args.unique_ratio, args.not_found_ratio)
+    centres = generate_centres(rng, centre_count)
+    timer = StageTimer(args.trace_memory)
+
+    with timer.stage("normalize_postal_codes", tutor_count):
+        normalize_postal_codes([postal for _, postal in raw_rows])
+
+    pair_count = min(args.haversine_pairs, tutor_count * centre_count)
+    tutor_points = np.column_stack((rng.uniform(*LAT_RANGE, pair_count), rng.uniform(*LON_RANGE, pair_count))).tolist()
+    centre_points = [(centres[i % centre_count]["lat"], centres[i % centre_count]["lon"]) for i in range(pair_count)]
+    with timer.stage("haversine_km", pair_count):
+        for (lat1, lon1), (lat2, lon2) in zip(tutor_points, centre_points):
+            haversine_km(lat1, lon1, lat2, lon2)
+
+    tutors = tutors_from_rows(raw_rows)
+    postals = lookup_codes(tutors)
+
+    cache_path = os.path.join(work_dir, f"cache_{tutor_count}_{centre_count}.sqlite3")
+    cache = GeocodeCache(cache_path)
+    client = SyntheticGeocoder(args.latency_ms) if args.geocoder == "synthetic" else make_geocoder(args.geocoder)
+    try:
+        with timer.stage("geocode_cold", len(postals)):
+            coordinates = geocode_many(postals, cache=cache, client=client, max_workers=args.workers, report=False)
+        cold = cache_stats(cache, 0, 0)
+
+        hits_before, misses_before = cache.hits, cache.misses
+        with timer.stage("geocode_warm", len(postals)):
+            coordinates = geocode_many(postals, cache=cache, client=client, max_workers=args.workers, report=False)
+        warm = cache_stats(cache, hits_before, misses_before)
+
+        matcher = CentreMatcher(centres)
+        with timer.stage("match_centres", len(tutors)):
+            results = match_centres(tutors, coordinates, centres, matcher)
+
+        exact_matcher = CentreMatcher(centres, exact=True)
+        with timer.stage("match_centres_exact", len(tutors)):
+            exact_results = match_centres(tutors, coordinates, centres, exact_matcher)
+        if exact_results != results:
+            raise AssertionError("match_centres differs from the exact-only path")
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with timer.stage("build_results", len(tutors)):
+                results = build_results(tutors, centres, cache, client)
+
+        book = CsvBook(os.path.join(work_dir, f"output_{tutor_count}_{centre_count}"))
+        os.makedirs(book.folder, exist_ok=True)
+        with timer.stage("write_results", len(results)):
+            write_results(book, results)
+            book.save()
+
+        geocoder_stats = client.stats.summary()
+    finally:
+        cache.close()
+        client.close()
+
+    return {
+        "tutors": tutor_count,
+        "centres": centre_count,
+        "unique_postal_codes": len(set(code for code in postals if code)),
+        "spatial_index": matcher.index is not None,
+        "stages": timer.stages,
+        "cache": {"cold": cold, "warm": warm},
+        "geocoder": geocoder_stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tutors", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--centres", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--unique-ratio", type=float, default=0.3, help="Distinct postal codes per tutor row.")
+    parser.add_argument("--not-found-ratio", type=float, default=0.02, help="Share of postal codes the geocoder misses.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay of the synthetic geocoder per lookup.")
+    parser.add_argument(
+        "--geocoder",
+        default="synthetic",
+        help="synthetic (default) or any --geocoder spec, e.g. onemap:<mock_onemap.py URL>.",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent geocoding workers.")
+    parser.add_argument("--haversine-pairs", type=int, default=200000, help="Cap on pairs timed through haversine_km.")
+    parser.add_argument("--trace-memory", action="store_true", help="Record peak Python memory per stage (slower).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of printing it.")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="location_mapper_bench_")
+    runs = []
+    try:
+        for tutor_count in args.tutors:
+            for centre_count in args.centres:
+                print(f"Running {tutor_count} tutors x {centre_count} centres...", file=sys.stderr)
+                runs.append(run_case(tutor_count, centre_count, args, rng, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "location_mapper_pipeline",
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "settings": {
+            "unique_ratio": args.unique_ratio,
+            "not_found_ratio": args.not_found_ratio,
+            "latency_ms": args.latency_ms,
+            "geocoder": args.geocoder,
+            "workers": args.workers,
+            "haversine_pairs": args.haversine_pairs,
+            "trace_memory": args.trace_memory,
+            "seed": args.seed,
+        },
+        "runs": runs,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the KD-tree centre index against the vectorized full scan.
+
+Usage: python benchmarks/bench_spatial_index.py [--tutors 20000] [--centres 100 1000 10000 50000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance_engine import CentreArrays, nearest_centres  # noqa: E402
+from spatial_index import CentreIndex  # noqa: E402
+
+# Rough bounding box of mainland Singapore.
+LAT_RANGE = (1.24, 1.47)
+LON_RANGE = (103.62, 104.03)
+
+
+def random_points(rng, count):
+    lats = rng.uniform(*LAT_RANGE, count)
+    lons = rng.uniform(*LON_RANGE, count)
+    return lats, lons
+
+
+def run(tutor_count, centre_counts, top_n, seed):
+    rng = np.random.default_rng(seed)
+    tutor_lats, tutor_lons = random_points(rng, tutor_count)
+
+    print(f"{'centres':>10} {'scan (s)':>10} {'build (s)':>10} {'index (s)':>10} {'speedup':>8}  same")
+    for centre_count in centre_counts:
+        lats, lons = random_points(rng, centre_count)
+        centres = [{"name": f"Centre {i}", "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(zip(lats, lons))]
+        centre_arrays = CentreArrays(centres)
+
+        started = time.perf_counter()
+        scan = nearest_centres(tutor_lats, tutor_lons, centre_arrays, top_n)
+        scan_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = CentreIndex(centre_arrays)
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = index.nearest(tutor_lats, tutor_lons, top_n)
+        index_seconds = time.perf_counter() - started
+
+        speedup = scan_seconds / (build_seconds + index_seconds)
+        print(
+            f"{centre_count:>10} {scan_seconds:>10.3f} {build_seconds:>10.3f} "
+            f"{index_seconds:>10.3f} {speedup:>7.1f}x  {scan == indexed}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tutors", type=int, default=20000)
+    parser.add_argument("--centres", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run(args.tutors, args.centres, args.top_n, args.seed)
+
+
+if __name__ == "__main__":
+    main()
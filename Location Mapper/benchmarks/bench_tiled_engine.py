@@ -0,0 +1,70 @@
+"""
+Compare the tiled engine against the full scan, across worker counts.
+
+Usage: python benchmarks/bench_tiled_engine.py [--tutors 50000] [--centres 20000] [--workers 1 2 4 8] [--processes]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance_engine import TILE_MEMORY_MB, CentreArrays, nearest_centres, nearest_centres_tiled, tile_shape  # noqa: E402
+from mock_onemap import LAT_RANGE, LON_RANGE  # noqa: E402
+
+
+def random_points(rng, count):
+    lats = rng.uniform(*LAT_RANGE, count)
+    lons = rng.uniform(*LON_RANGE, count)
+    return lats, lons
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    tutor_lats, tutor_lons = random_points(rng, args.tutors)
+    lats, lons = random_points(rng, args.centres)
+    centre_arrays = CentreArrays(
+        [{"name": f"Centre {i}", "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(zip(lats, lons))]
+    )
+
+    started = time.perf_counter()
+    scan = nearest_centres(tutor_lats, tutor_lons, centre_arrays, args.top_n)
+    scan_seconds = time.perf_counter() - started
+    print(f"{args.tutors} tutors x {args.centres} centres, full scan: {scan_seconds:.3f} s")
+
+    print(f"{'workers':>8} {'tile':>14} {'tiled (s)':>10} {'speedup':>8}  same")
+    for workers in args.workers:
+        rows, cols = tile_shape(args.tutors, args.centres, args.memory_mb, workers)
+        started = time.perf_counter()
+        tiled = nearest_centres_tiled(
+            tutor_lats,
+            tutor_lons,
+            centre_arrays,
+            args.top_n,
+            memory_mb=args.memory_mb,
+            workers=workers,
+            use_processes=args.processes,
+        )
+        seconds = time.perf_counter() - started
+        print(f"{workers:>8} {f'{rows}x{cols}':>14} {seconds:>10.3f} {scan_seconds / seconds:>7.1f}x  {scan == tiled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tutors", type=int, default=50000)
+    parser.add_argument("--centres", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--memory-mb", type=float, default=TILE_MEMORY_MB)
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads.")
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
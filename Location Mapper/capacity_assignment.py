@@ -0,0 +1,265 @@
+"""
+One centre per tutor, within each centre's capacity.
+
+Usage: proximity_checker.exe <workbook> --assign [5]
+
+Capacities come from column E ("Capacity") of Centre Info; a blank cell
+means no limit. Each tutor may go to one of their K nearest centres, and
+the assignment with the smallest total distance (as shown, in km to 2
+decimals) is found as a minimum-cost flow on that sparse tutor-centre
+graph (see AssignmentFlow). As many tutors as possible are assigned
+first; the rest are listed as unassigned. Tutors at the same coordinates
+are solved as one group and move together.
+"""
+import heapq
+import math
+
+import numpy as np
+
+ASSIGNMENT_SHEET = "Assignment"
+UNASSIGNED_SHEET = "Unassigned Tutors"
+CENTRE_LOAD_SHEET = "Centre Load"
+HEADER_ROW = 5
+DEFAULT_CANDIDATES = 5
+ASSIGNMENT_HEADERS = ["Name", "Postal Code", "Assigned Centre", "Distance (km)", "Choice"]
+UNASSIGNED_HEADERS = ["Name", "Postal Code", "Nearest Centre", "Distance (km)"]
+CENTRE_LOAD_HEADERS = ["Centre", "Capacity", "Assigned", "Spare"]
+
+
+def centre_capacities(centres):
+    """Capacity per centre, with None for no limit. Negative values count as 0."""
+    capacities = []
+    for centre in centres:
+        capacity = centre.get("capacity")
+        capacities.append(None if capacity is None else max(0, int(capacity)))
+    return capacities
+
+
+class AssignmentFlow:
+    """
+    Minimum-cost flow of tutors into centres, on the K-nearest graph.
+
+    Every group of tutors starts at its nearest centre, which is the
+    cheapest possible assignment but may overfill some centres. Each
+    overfilled centre then sends its extra tutors along the cheapest chain
+    of moves (tutor at A moves to B, a tutor at B moves to C, ...) that
+    ends at a centre with space, or, if there is none, drops the tutor
+    whose removal costs least. Chains are found with Dijkstra over the
+    centres, using node potentials so every edge cost is non-negative
+    (successive shortest paths). Only centres near the overfilled one are
+    usually visited, so the work grows with the overfill, not with the
+    number of tutors times centres.
+
+    Edge costs are in hundredths of a km. Dropping a tutor costs more than
+    any chain that makes room for them, so the number assigned comes first
+    and the total distance second.
+    """
+
+    def __init__(self, candidates, costs, counts, capacities):
+        self.candidates = candidates
+        self.costs = costs
+        self.n_centres = len(capacities)
+        self.drop = self.n_centres
+        self.capacity = [math.inf if capacity is None else capacity for capacity in capacities]
+        largest = max((max(row) for row in costs if row), default=0)
+        self.drop_cost = (self.n_centres + 1) * (largest + 1)
+
+        self.position = [{centre: choice for choice, centre in enumerate(row)} for row in candidates]
+        self.taken = [[0] * len(row) for row in candidates]
+        self.dropped = [0] * len(candidates)
+        self.load = [0] * self.n_centres
+        self.potential = [0] * (self.n_centres + 1)
+        # edges[a][b] is a heap of (cost, group) for moving one tutor of
+        # group from a to b; entries go stale once the group has left a.
+        # Dropped tutors never come back: the centres they could use were
+        # already full, and centres only ever fill up.
+        self.edges = [{} for _ in range(self.n_centres)]
+
+        for group, count in enumerate(counts):
+            if count and candidates[group]:
+                self.taken[group][0] = count
+                self.load[candidates[group][0]] += count
+                self.add_edges(group, candidates[group][0])
+            else:
+                self.dropped[group] = count
+
+    def units(self, group, centre):
+        return self.taken[group][self.position[group][centre]]
+
+    def add_edges(self, group, node):
+        """Edges out of centre node for a group that has just arrived there."""
+        edges = self.edges[node]
+        here = self.costs[group][self.position[group][node]]
+        for centre, cost in zip(self.candidates[group], self.costs[group]):
+            if centre != node:
+                heapq.heappush(edges.setdefault(centre, []), (cost - here, group))
+        heapq.heappush(edges.setdefault(self.drop, []), (self.drop_cost - here, group))
+
+    def has_space(self, node):
+        return node == self.drop or self.load[node] < self.capacity[node]
+
+    def shortest_path(self, source):
+        """
+        Cheapest chain from source to a node with space, as a list of
+        (from, to, group) moves, plus that node's reduced distance. Updates
+        the potentials for the next search.
+        """
+        potential = self.potential
+        distance = {source: 0}
+        parent = {source: None}
+        settled = set()
+        queue = [(0, source)]
+        target = None
+        while queue:
+            node_distance, node = heapq.heappop(queue)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node != source and self.has_space(node):
+                target = node
+                break
+            # The drop node always has space, so it is never passed through.
+            for neighbour, heap in self.edges[node].items():
+                while heap and self.units(heap[0][1], node) == 0:
+                    heapq.heappop(heap)
+                if not heap or neighbour in settled:
+                    continue
+                cost, group = heap[0]
+                candidate = node_distance + cost + potential[node] - potential[neighbour]
+                if candidate < distance.get(neighbour, math.inf):
+                    distance[neighbour] = candidate
+                    parent[neighbour] = (node, group)
+                    heapq.heappush(queue, (candidate, neighbour))
+
+        # The drop node is always reachable from an overfilled centre.
+        target_distance = distance[target]
+        for node in range(len(potential)):
+            if node in settled and distance[node] < target_distance:
+                potential[node] += distance[node]
+            else:
+                potential[node] += target_distance
+
+        moves = []
+        node = target
+        while parent[node] is not None:
+            previous, group = parent[node]
+            moves.append((previous, node, group))
+            node = previous
+        moves.reverse()
+        return moves
+
+    def move(self, moves, amount):
+        for source, target, group in moves:
+            self.taken[group][self.position[group][source]] -= amount
+            if target == self.drop:
+                self.dropped[group] += amount
+                continue
+            choice = self.position[group][target]
+            if self.taken[group][choice] == 0:
+                self.add_edges(group, target)
+            self.taken[group][choice] += amount
+        self.load[moves[0][0]] -= amount
+        if moves[-1][1] != self.drop:
+            self.load[moves[-1][1]] += amount
+
+    def solve(self):
+        for centre in range(self.n_centres):
+            while self.load[centre] > self.capacity[centre]:
+                moves = self.shortest_path(centre)
+                # Tutors that share a group and a chain all move together.
+                amount = self.load[centre] - self.capacity[centre]
+                last = moves[-1][1]
+                if last != self.drop:
+                    amount = min(amount, self.capacity[last] - self.load[last])
+                for source, _, group in moves:
+                    amount = min(amount, self.units(group, source))
+                self.move(moves, amount)
+        return self.taken
+
+
+def solve_assignment(candidates, costs, counts, capacities):
+    """
+    How many tutors of each group go to each of its candidate centres.
+
+    candidates is a list of centre indices per group, nearest first;
+    costs are the matching distances in hundredths of a km; counts is
+    tutors per group; capacities is per centre (None for no limit).
+    Returns a list of counts per group, in candidate order.
+    """
+    return AssignmentFlow(candidates, costs, counts, capacities).solve()
+
+
+def assign_tutors(tutors, coordinates, centres, matcher, candidates=DEFAULT_CANDIDATES):
+    """
+    (assigned rows, unassigned rows, centre load rows) for one run.
+
+    Tutors without coordinates are left out of all three; the Output
+    sheet already says why.
+    """
+    capacities = centre_capacities(centres)
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    assigned = []
+    unassigned = []
+    load = [0] * len(centres)
+
+    if found and centres:
+        points = np.array([coordinates[i] for i in found], dtype=np.float64)
+        unique_points, group_of, counts = np.unique(points, axis=0, return_inverse=True, return_counts=True)
+        matches = matcher.nearest(unique_points[:, 0], unique_points[:, 1], min(candidates, len(centres)))
+        candidate_centres = [[index for _, index in row] for row in matches]
+        candidate_km = [[km for km, _ in row] for row in matches]
+        costs = [[round(km * 100) for km in row] for row in candidate_km]
+        remaining = solve_assignment(candidate_centres, costs, counts.tolist(), capacities)
+
+        # Hand out each group's places in User Input order, nearest first.
+        for tutor_index, group in zip(found, group_of.ravel().tolist()):
+            tutor = tutors[tutor_index]
+            places = remaining[group]
+            choice = next((choice for choice, count in enumerate(places) if count), None)
+            if choice is None:
+                centre_index = candidate_centres[group][0]
+                unassigned.append(
+                    [tutor["name"], tutor["postal"], centres[centre_index]["name"], candidate_km[group][0]]
+                )
+                continue
+            places[choice] -= 1
+            centre_index = candidate_centres[group][choice]
+            load[centre_index] += 1
+            assigned.append(
+                [tutor["name"], tutor["postal"], centres[centre_index]["name"], candidate_km[group][choice], choice + 1]
+            )
+
+    load_rows = []
+    for centre, capacity, count in zip(centres, capacities, load):
+        load_rows.append([centre["name"], capacity, count, None if capacity is None else capacity - count])
+    return assigned, unassigned, load_rows
+
+
+def write_assignment_sheets(
+    book,
+    tutors,
+    coordinates,
+    centres,
+    matcher,
+    metrics=None,
+    candidates=DEFAULT_CANDIDATES,
+):
+    """Fill the "Assignment", "Unassigned Tutors" and "Centre Load" sheets for one run."""
+    from workbook_io import write_sheet
+
+    assigned, unassigned, load_rows = assign_tutors(tutors, coordinates, centres, matcher, candidates)
+    write_sheet(book, ASSIGNMENT_SHEET, HEADER_ROW, ASSIGNMENT_HEADERS, assigned)
+    write_sheet(book, UNASSIGNED_SHEET, HEADER_ROW, UNASSIGNED_HEADERS, unassigned)
+    write_sheet(book, CENTRE_LOAD_SHEET, HEADER_ROW, CENTRE_LOAD_HEADERS, load_rows)
+
+    if all(row[1] is None for row in load_rows):
+        print("No capacities in Centre Info column E, so every centre was treated as unlimited.")
+    full = sum(1 for row in load_rows if row[1] and row[3] == 0)
+    total_km = sum(row[3] for row in assigned)
+    print(
+        f"Assigned {len(assigned)} tutors ({total_km:.2f} km in total), {len(unassigned)} unassigned, "
+        f"{full} centres full."
+    )
+    if metrics is not None:
+        metrics.count("assigned", len(assigned))
+        metrics.count("unassigned", len(unassigned))
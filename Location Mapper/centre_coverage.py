@@ -0,0 +1,181 @@
+"""
+Centre coverage and distance bands, from every tutor-centre distance.
+
+Usage: proximity_checker.exe <workbook> --coverage [1 3 5] [--unserved-km 5]
+
+For each centre: how many tutors are within each distance band, and the
+nearest and median tutor distance. Tutors with no centre within the
+unserved distance are listed separately. Unlike counting over the
+Output sheet, this looks at every centre for every tutor, not just the
+Top 3. Distances are computed in tiles of tutors x centres and folded
+into running totals, so memory stays flat and the stream matcher can
+feed it one chunk at a time.
+"""
+import numpy as np
+
+from distance_engine import BLOCK_ELEMENTS, CentreArrays, haversine_rad
+
+COVERAGE_SHEET = "Coverage"
+UNSERVED_SHEET = "Unserved Tutors"
+HEADER_ROW = 5
+DEFAULT_BANDS_KM = (1.0, 3.0, 5.0)
+UNSERVED_HEADERS = ["Name", "Postal Code", "Nearest Centre", "Distance (km)"]
+
+# Medians come from a per-centre histogram of distances rounded to 0.01 km,
+# which gives the exact median of the distances as shown. Past this many
+# bins in total the bins get wider to keep memory bounded.
+HISTOGRAM_MAX_KM = 100
+HISTOGRAM_MAX_ELEMENTS = 16_000_000
+
+
+def coverage_headers(bands_km):
+    return (
+        ["Centre"]
+        + [f"Tutors within {band:g} km" for band in bands_km]
+        + ["Nearest Tutor (km)", "Median Tutor Distance (km)"]
+    )
+
+
+class CoverageStats:
+    """Running coverage totals for one set of centres, fed batches of tutors."""
+
+    def __init__(self, centres, bands_km=DEFAULT_BANDS_KM, unserved_km=None, block_elements=BLOCK_ELEMENTS):
+        self.centre_arrays = centres if isinstance(centres, CentreArrays) else CentreArrays(centres)
+        self.bands_km = sorted(float(band) for band in bands_km)
+        self.unserved_km = float(unserved_km) if unserved_km is not None else self.bands_km[-1]
+        self.block_elements = block_elements
+
+        n_centres = len(self.centre_arrays)
+        self.tutors = 0
+        self.band_counts = np.zeros((len(self.bands_km), n_centres), dtype=np.int64)
+        self.nearest_km = np.full(n_centres, np.inf)
+
+        # Histogram bins are bin_units hundredths of a km wide; the last bin
+        # also holds everything further than HISTOGRAM_MAX_KM.
+        fine_bins = HISTOGRAM_MAX_KM * 100 + 1
+        self.bin_units = max(1, -(-fine_bins * max(1, n_centres) // HISTOGRAM_MAX_ELEMENTS))
+        self.bins = -(-fine_bins // self.bin_units)
+        self.histogram = np.zeros((n_centres, self.bins), dtype=np.int32)
+        self.histogram_flat = self.histogram.reshape(-1)
+
+        self.unserved = []
+
+    def add(self, tutor_lats, tutor_lons, labels):
+        """
+        Fold in one batch of located tutors (degrees). labels holds a
+        (name, postal code) per tutor, used for the unserved list.
+        """
+        lat_rad = np.radians(np.asarray(tutor_lats, dtype=np.float64))
+        lon_rad = np.radians(np.asarray(tutor_lons, dtype=np.float64))
+        n_centres = len(self.centre_arrays)
+        if len(lat_rad) == 0:
+            return
+        self.tutors += len(lat_rad)
+        if n_centres == 0:
+            self.unserved.extend([name, postal, None, None] for name, postal in labels)
+            return
+
+        tile_cols = max(1, min(n_centres, self.block_elements))
+        block_rows = max(1, self.block_elements // tile_cols)
+        centres = self.centre_arrays
+        for start in range(0, len(lat_rad), block_rows):
+            lat = lat_rad[start:start + block_rows, None]
+            lon = lon_rad[start:start + block_rows, None]
+            tutor_nearest = np.full(len(lat), np.inf)
+            tutor_centre = np.zeros(len(lat), dtype=np.intp)
+
+            for first in range(0, n_centres, tile_cols):
+                last = min(first + tile_cols, n_centres)
+                distances = haversine_rad(
+                    lat,
+                    lon,
+                    centres.lat[None, first:last],
+                    centres.lon[None, first:last],
+                    centres.cos_lat[None, first:last],
+                )
+                for band_index, band in enumerate(self.bands_km):
+                    self.band_counts[band_index, first:last] += np.count_nonzero(distances <= band, axis=0)
+                np.minimum(self.nearest_km[first:last], distances.min(axis=0), out=self.nearest_km[first:last])
+
+                closest = distances.argmin(axis=1)
+                closest_km = distances[np.arange(len(lat)), closest]
+                better = closest_km < tutor_nearest
+                tutor_nearest[better] = closest_km[better]
+                tutor_centre[better] = closest[better] + first
+
+                bins = np.rint(distances * 100).astype(np.int64)
+                bins //= self.bin_units
+                np.minimum(bins, self.bins - 1, out=bins)
+                bins += np.arange(first, last) * self.bins
+                np.add.at(self.histogram_flat, bins.ravel(), np.int32(1))
+
+            for position in np.flatnonzero(tutor_nearest > self.unserved_km).tolist():
+                name, postal = labels[start + position]
+                centre_index = int(tutor_centre[position])
+                self.unserved.append(
+                    [name, postal, centres.names[centre_index], round(float(tutor_nearest[position]), 2)]
+                )
+
+    def medians_km(self):
+        """Median tutor distance per centre (None past HISTOGRAM_MAX_KM)."""
+        if self.tutors == 0:
+            return [None] * len(self.centre_arrays)
+        cumulative = np.cumsum(self.histogram, axis=1)
+        low = np.argmax(cumulative > (self.tutors - 1) // 2, axis=1)
+        high = np.argmax(cumulative > self.tutors // 2, axis=1)
+        # Wider bins report their middle.
+        offset = (self.bin_units - 1) / 2
+        medians = ((low + high) / 2 * self.bin_units + offset) / 100
+        overflow = high >= self.bins - 1
+        return [None if over else round(float(value), 2) for value, over in zip(medians, overflow)]
+
+    def coverage_rows(self):
+        rows = []
+        medians = self.medians_km()
+        for index, name in enumerate(self.centre_arrays.names):
+            nearest = self.nearest_km[index]
+            rows.append(
+                [name]
+                + self.band_counts[:, index].tolist()
+                + [round(float(nearest), 2) if np.isfinite(nearest) else None, medians[index]]
+            )
+        return rows
+
+
+def add_tutors(stats, tutors, coordinates):
+    """Feed the tutors that have coordinates into a CoverageStats."""
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    stats.add(
+        [coordinates[i][0] for i in found],
+        [coordinates[i][1] for i in found],
+        [(tutors[i]["name"], tutors[i]["postal"]) for i in found],
+    )
+
+
+def report_coverage(stats):
+    print(
+        f"Coverage: {len(stats.unserved)} of {stats.tutors} located tutors have no centre within "
+        f"{stats.unserved_km:g} km."
+    )
+
+
+def write_coverage_sheets(
+    book,
+    tutors,
+    coordinates,
+    centres,
+    matcher,
+    metrics=None,
+    bands_km=DEFAULT_BANDS_KM,
+    unserved_km=None,
+):
+    """Fill the "Coverage" and "Unserved Tutors" sheets for one run."""
+    from workbook_io import write_sheet
+
+    stats = CoverageStats(matcher.centre_arrays, bands_km, unserved_km)
+    add_tutors(stats, tutors, coordinates)
+    write_sheet(book, COVERAGE_SHEET, HEADER_ROW, coverage_headers(stats.bands_km), stats.coverage_rows())
+    write_sheet(book, UNSERVED_SHEET, HEADER_ROW, UNSERVED_HEADERS, stats.unserved)
+    report_coverage(stats)
+    if metrics is not None:
+        metrics.count("unserved", len(stats.unserved))
@@ -0,0 +1,486 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Roughly how many tutor x centre distances to hold in memory at once.
+BLOCK_ELEMENTS = 250_000
+
+# Distances are shown rounded to 2 decimals, so anything within this much
+# of the N-th nearest centre could still tie with it after rounding.
+ROUNDING_SLACK_KM = 0.01
+
+# From this many centres a spatial index beats scanning every centre.
+SPATIAL_INDEX_MIN_CENTRES = 500
+
+# Cap on the tiled engine's working memory, shared by all of its workers.
+# Tiles never grow past BLOCK_ELEMENTS, which keeps them in CPU cache.
+TILE_MEMORY_MB = 64
+# Float64 values alive per tile element while a tile is scored.
+TILE_BYTES_PER_ELEMENT = 8 * 3
+TILE_MIN_ROWS = 64
+
+ENGINES = ("auto", "scan", "index", "tiled")
+
+# The float32 first pass is only used where its error bound stays small:
+# tutors and centres within this many radians (about 320 km) of each
+# other in latitude and longitude, and away from the poles.
+APPROX_MAX_SPAN_RAD = 0.05
+APPROX_MAX_ABS_LAT_RAD = math.radians(60)
+# Generous cover for float32 rounding in the few operations of the pass.
+APPROX_FLOAT32_RELATIVE_ERROR = 1e-6
+
+
+class CentreArrays:
+    """Centre names and coordinates converted to radian arrays once per run."""
+
+    def __init__(self, centres):
+        self.names = [centre["name"] for centre in centres]
+        self.lat = np.radians(np.array([centre["lat"] for centre in centres], dtype=np.float64))
+        self.lon = np.radians(np.array([centre["lon"] for centre in centres], dtype=np.float64))
+        self.cos_lat = np.cos(self.lat)
+
+        # Offsets from the middle of the centres' bounding box, for the
+        # float32 first pass (small offsets keep float32 precise).
+        if len(self.names):
+            self.lat_min, self.lat_max = float(self.lat.min()), float(self.lat.max())
+            self.lon_min, self.lon_max = float(self.lon.min()), float(self.lon.max())
+        else:
+            self.lat_min = self.lat_max = self.lon_min = self.lon_max = 0.0
+        self.ref_lat = (self.lat_min + self.lat_max) / 2
+        self.ref_lon = (self.lon_min + self.lon_max) / 2
+        self.lat32 = (self.lat - self.ref_lat).astype(np.float32)
+        self.lon32 = (self.lon - self.ref_lon).astype(np.float32)
+        self.cos_ref32 = np.float32(math.cos(self.ref_lat))
+
+    def __len__(self):
+        return len(self.names)
+
+
+def haversine_rad(lat1, lon1, lat2, lon2, cos_lat2):
+    """
+    Haversine distance in km between broadcastable radian arrays.
+
+    Same arithmetic as proximity_checker.haversine_km, done in place to
+    limit temporaries. cos_lat2 is np.cos(lat2), passed in so it can be
+    precomputed once per centre.
+    """
+    a = np.subtract(lat2, lat1)
+    a /= 2
+    np.sin(a, out=a)
+    np.square(a, out=a)
+
+    b = np.subtract(lon2, lon1)
+    b /= 2
+    np.sin(b, out=b)
+    np.square(b, out=b)
+    b *= np.cos(lat1) * cos_lat2
+    a += b
+
+    np.subtract(1, a, out=b)
+    np.sqrt(b, out=b)
+    np.sqrt(a, out=a)
+    np.arctan2(a, b, out=a)
+    a *= EARTH_RADIUS_KM * 2
+    return a
+
+
+def haversine_block(lat_rad, lon_rad, centre_arrays):
+    """
+    Distances in km from each tutor (radian arrays) to every centre.
+
+    Returns an array of shape (len(lat_rad), len(centre_arrays)).
+    """
+    return haversine_rad(
+        lat_rad[:, None],
+        lon_rad[:, None],
+        centre_arrays.lat[None, :],
+        centre_arrays.lon[None, :],
+        centre_arrays.cos_lat[None, :],
+    )
+
+
+def rank_row(distances, candidate_indices, top_n):
+    """
+    Order a shortlist of centres the same way the original loop did.
+
+    Distances are rounded to 2 decimals first and ties keep Centre Info
+    order, exactly like sorting the full rounded list with a stable sort.
+    """
+    ranked = sorted(
+        ((round(float(distances[i]), 2), int(i)) for i in candidate_indices),
+    )
+    return ranked[:top_n]
+
+
+def top_n_block(distances, top_n):
+    """
+    Top-N centres for every row of a distance block.
+
+    Returns a list (one per row) of [(rounded_km, centre_index), ...].
+    """
+    n_centres = distances.shape[1]
+    if n_centres == 0:
+        return [[] for _ in range(distances.shape[0])]
+
+    k = min(top_n, n_centres)
+    if k == n_centres:
+        return [rank_row(row, range(n_centres), top_n) for row in distances]
+
+    # Only the N-th smallest value per row is needed to build the shortlist.
+    kth = np.partition(distances, k - 1, axis=1)[:, k - 1]
+    within = distances <= (kth + ROUNDING_SLACK_KM)[:, None]
+
+    results = []
+    for row, mask in zip(distances, within):
+        results.append(rank_row(row, np.flatnonzero(mask), top_n))
+    return results
+
+
+def approximation_bound(lat_rad, lon_rad, centre_arrays):
+    """
+    (relative, absolute) error bound, in radians, of approximate_block
+    for this block of tutors, or None if the block is too spread out for
+    the approximation to be worth using.
+
+    For two points inside a box spanning s radians, with the most polar
+    latitude L, the equirectangular angle differs from the great-circle
+    angle by at most s^2 * (1/5 + 1/(4 cos^2 L)) of itself (Taylor bounds
+    on sin). Taking the box's middle latitude for the cosine, rather than
+    each pair's, adds at most (latitude offset) * tan(L). Float32 rounding
+    of the small offsets adds the rest.
+    """
+    lat_lo = min(float(lat_rad.min()), centre_arrays.lat_min)
+    lat_hi = max(float(lat_rad.max()), centre_arrays.lat_max)
+    lon_lo = min(float(lon_rad.min()), centre_arrays.lon_min)
+    lon_hi = max(float(lon_rad.max()), centre_arrays.lon_max)
+    span = max(lat_hi - lat_lo, lon_hi - lon_lo)
+    max_abs_lat = max(abs(lat_lo), abs(lat_hi))
+    if span > APPROX_MAX_SPAN_RAD or max_abs_lat > APPROX_MAX_ABS_LAT_RAD:
+        return None
+
+    ref_lat = centre_arrays.ref_lat
+    lat_offset = max(lat_hi - ref_lat, ref_lat - lat_lo)
+    flattening = span ** 2 * (0.2 + 0.25 / math.cos(max_abs_lat) ** 2)
+    relative = 1.1 * (flattening + lat_offset * math.tan(max_abs_lat) + APPROX_FLOAT32_RELATIVE_ERROR)
+    absolute = 4 * span * float(np.finfo(np.float32).eps)
+    return relative, absolute
+
+
+def approximate_block(lat_rad, lon_rad, centre_arrays):
+    """
+    Equirectangular angles (radians, float32) from each tutor to every
+    centre: a handful of float32 multiplies instead of the trigonometry
+    of the Haversine formula.
+    """
+    lat = (lat_rad - centre_arrays.ref_lat).astype(np.float32)[:, None]
+    lon = (lon_rad - centre_arrays.ref_lon).astype(np.float32)[:, None]
+
+    dlat = np.subtract(centre_arrays.lat32[None, :], lat)
+    np.square(dlat, out=dlat)
+    dlon = np.subtract(centre_arrays.lon32[None, :], lon)
+    dlon *= centre_arrays.cos_ref32
+    np.square(dlon, out=dlon)
+    dlat += dlon
+    return np.sqrt(dlat, out=dlat)
+
+
+def top_n_block_approx(lat_rad, lon_rad, centre_arrays, top_n, bound):
+    """
+    Same result as top_n_block(haversine_block(...)), but the Haversine
+    formula only runs on a shortlist.
+
+    The float32 pass finds each tutor's k-th nearest centre to within the
+    error bound; every centre whose approximate distance could still put
+    it within the rounding slack of that is scored exactly, and the exact
+    distances are ranked as usual.
+    """
+    relative, absolute = bound
+    n_rows = len(lat_rad)
+    approx = approximate_block(lat_rad, lon_rad, centre_arrays)
+
+    k = min(top_n, len(centre_arrays))
+    kth = np.partition(approx, k - 1, axis=1)[:, k - 1].astype(np.float64)
+    threshold = kth * (1 + relative) + absolute + ROUNDING_SLACK_KM / EARTH_RADIUS_KM
+    cutoff = (threshold + absolute) / (1 - relative)
+    cutoff = np.nextafter(cutoff.astype(np.float32), np.float32(np.inf))
+    rows, cols = np.nonzero(approx <= cutoff[:, None])
+
+    km = haversine_rad(
+        lat_rad[rows],
+        lon_rad[rows],
+        centre_arrays.lat[cols],
+        centre_arrays.lon[cols],
+        centre_arrays.cos_lat[cols],
+    )
+
+    # The shortlist holds every tutor's k nearest, so its k-th exact
+    # distance is the same one a full scan would find.
+    order = np.lexsort((km, rows))
+    counts = np.bincount(rows, minlength=n_rows)
+    starts = np.cumsum(counts) - counts
+    kth_km = km[order][starts + k - 1]
+    keep = km <= (kth_km + ROUNDING_SLACK_KM)[rows]
+    return rank_candidates(rows[keep], cols[keep], km[keep], n_rows, top_n)
+
+
+def nearest_centres(tutor_lats, tutor_lons, centre_arrays, top_n, block_elements=BLOCK_ELEMENTS, exact=False):
+    """
+    Top-N nearest centres for many tutors at once.
+
+    tutor_lats/tutor_lons are degrees. Returns a list (one per tutor) of
+    [(rounded_km, centre_index), ...], nearest first.
+
+    Where tutors and centres are close together (anywhere in Singapore),
+    a float32 first pass narrows each tutor down before the Haversine
+    formula runs; the results are the same. exact=True runs the formula
+    on every pair, for auditing.
+    """
+    lat_rad = np.radians(np.asarray(tutor_lats, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(tutor_lons, dtype=np.float64))
+    if len(centre_arrays) == 0:
+        return [[] for _ in range(len(lat_rad))]
+
+    block_rows = max(1, block_elements // max(1, len(centre_arrays)))
+    results = []
+    for start in range(0, len(lat_rad), block_rows):
+        stop = start + block_rows
+        lat, lon = lat_rad[start:stop], lon_rad[start:stop]
+        bound = None if exact else approximation_bound(lat, lon, centre_arrays)
+        if bound is None:
+            results.extend(top_n_block(haversine_block(lat, lon, centre_arrays), top_n))
+        else:
+            results.extend(top_n_block_approx(lat, lon, centre_arrays, top_n, bound))
+    return results
+
+
+def tile_shape(n_tutors, n_centres, memory_mb=TILE_MEMORY_MB, workers=1):
+    """
+    (rows, cols) of one tutor x centre tile so that every worker's tile
+    fits in memory_mb together. Rows are also capped so there are a few
+    blocks per worker to share out.
+    """
+    budget = int(memory_mb * 1024 * 1024 / TILE_BYTES_PER_ELEMENT / max(1, workers))
+    elements = max(1, min(BLOCK_ELEMENTS, budget))
+    cols = max(1, min(n_centres, elements // TILE_MIN_ROWS))
+    rows = max(1, elements // cols)
+    if workers > 1:
+        rows = min(rows, max(TILE_MIN_ROWS, -(-n_tutors // (workers * 4))))
+    return min(rows, max(1, n_tutors)), cols
+
+
+def rank_candidates(rows, cols, km, n_rows, top_n):
+    """
+    Rank shortlisted (tutor row, centre index, km) triples, top_n per row.
+
+    Same order as rank_row: rounded to 2 decimals, ties by centre index.
+    NumPy's rounding only differs from round() right at a half-way point,
+    so rows with such a value are ranked with round() instead.
+    """
+    rounded = np.round(km, 2)
+    scaled = km * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    ambiguous = set(np.unique(rows[near_half]).tolist())
+
+    order = np.lexsort((cols, rounded, rows))
+    rows, cols, km, rounded = rows[order], cols[order], km[order], rounded[order]
+    counts = np.bincount(rows, minlength=n_rows)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    keep = np.arange(len(rows)) - starts[rows] < top_n
+
+    kept_km = rounded[keep].tolist()
+    kept_cols = cols[keep].tolist()
+    kept_counts = np.minimum(counts, top_n).tolist()
+
+    results = []
+    position = 0
+    for row, count in enumerate(kept_counts):
+        if row in ambiguous:
+            start, stop = starts[row], starts[row] + counts[row]
+            ranked = sorted((round(float(d), 2), int(c)) for d, c in zip(km[start:stop], cols[start:stop]))
+            results.append(ranked[:top_n])
+        else:
+            results.append(list(zip(kept_km[position:position + count], kept_cols[position:position + count])))
+        position += count
+    return results
+
+
+def nearest_in_block(lat_rad, lon_rad, centre_arrays, top_n, tile_cols):
+    """
+    Top-N centres for one block of tutors, scanning centres tile by tile.
+
+    Keeps the k smallest distances seen so far per tutor (a vectorized
+    running heap) and every centre that was within the rounding slack of
+    the k-th best at the time it was seen. After the last tile the
+    shortlist is trimmed against the final k-th distance, which gives
+    exactly the same shortlist, and ranking, as top_n_block.
+    """
+    n_rows = len(lat_rad)
+    n_centres = len(centre_arrays)
+    if n_centres == 0:
+        return [[] for _ in range(n_rows)]
+
+    k = min(top_n, n_centres)
+    best = np.empty((n_rows, 0))
+    shortlist_rows, shortlist_cols, shortlist_km = [], [], []
+
+    for start in range(0, n_centres, tile_cols):
+        stop = min(start + tile_cols, n_centres)
+        distances = haversine_rad(
+            lat_rad[:, None],
+            lon_rad[:, None],
+            centre_arrays.lat[None, start:stop],
+            centre_arrays.lon[None, start:stop],
+            centre_arrays.cos_lat[None, start:stop],
+        )
+
+        best = np.concatenate((best, distances), axis=1) if best.shape[1] else distances
+        if best.shape[1] > k:
+            best = np.partition(best, k - 1, axis=1)[:, :k]
+
+        if best.shape[1] < k:
+            rows, cols = np.nonzero(np.ones(distances.shape, dtype=bool))
+        else:
+            threshold = best.max(axis=1) + ROUNDING_SLACK_KM
+            rows, cols = np.nonzero(distances <= threshold[:, None])
+        shortlist_rows.append(rows)
+        shortlist_cols.append(cols + start)
+        shortlist_km.append(distances[rows, cols])
+
+    rows = np.concatenate(shortlist_rows)
+    cols = np.concatenate(shortlist_cols)
+    km = np.concatenate(shortlist_km)
+    kth = best.max(axis=1)
+    keep = km <= (kth + ROUNDING_SLACK_KM)[rows]
+    return rank_candidates(rows[keep], cols[keep], km[keep], n_rows, top_n)
+
+
+_process_centres = None
+
+
+def _init_process(centre_arrays):
+    global _process_centres
+    _process_centres = centre_arrays
+
+
+def _process_block(task):
+    lat_rad, lon_rad, top_n, tile_cols = task
+    return nearest_in_block(lat_rad, lon_rad, _process_centres, top_n, tile_cols)
+
+
+def nearest_centres_tiled(
+    tutor_lats,
+    tutor_lons,
+    centre_arrays,
+    top_n,
+    memory_mb=TILE_MEMORY_MB,
+    workers=None,
+    use_processes=False,
+):
+    """
+    Top-N nearest centres in bounded memory, spread over several workers.
+
+    Tutors are split into blocks and each block walks the centres in
+    tiles, so memory stays within memory_mb however many tutors and
+    centres there are. Blocks run on a thread pool (NumPy releases the
+    GIL while it computes) or, with use_processes, a process pool; on
+    Windows that needs the usual `if __name__ == "__main__"` guard.
+    Results are identical to nearest_centres.
+    """
+    lat_rad = np.radians(np.asarray(tutor_lats, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(tutor_lons, dtype=np.float64))
+    if len(lat_rad) == 0:
+        return []
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    block_rows, tile_cols = tile_shape(len(lat_rad), len(centre_arrays), memory_mb, workers)
+    blocks = [
+        (lat_rad[start:start + block_rows], lon_rad[start:start + block_rows])
+        for start in range(0, len(lat_rad), block_rows)
+    ]
+
+    if workers == 1 or len(blocks) == 1:
+        parts = [nearest_in_block(lat, lon, centre_arrays, top_n, tile_cols) for lat, lon in blocks]
+    elif use_processes:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_process,
+            initargs=(centre_arrays,),
+        ) as executor:
+            parts = list(executor.map(_process_block, [(lat, lon, top_n, tile_cols) for lat, lon in blocks]))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(
+                executor.map(lambda block: nearest_in_block(block[0], block[1], centre_arrays, top_n, tile_cols), blocks)
+            )
+
+    results = []
+    for part in parts:
+        results.extend(part)
+    return results
+
+
+class CentreMatcher:
+    """
+    Nearest-centre lookups for one set of centres, built once per run.
+
+    engine picks how:
+    - "scan": vectorized scan, one block of tutors at a time, with a
+      float32 first pass so only a shortlist needs the Haversine formula
+    - "index": KD-tree in spatial_index (needs SciPy)
+    - "tiled": bounded-memory tiles over tutors and centres, run on
+      `workers` threads within `memory_mb`
+    - "auto" (default): the index from SPATIAL_INDEX_MIN_CENTRES centres,
+      otherwise the scan; the tiled engine if SciPy is not installed
+    All engines give identical results. exact=True is for auditing: it
+    always uses the scan and runs the Haversine formula on every pair.
+    """
+
+    def __init__(self, centres, engine="auto", workers=None, memory_mb=TILE_MEMORY_MB, exact=False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Choose from: {', '.join(ENGINES)}.")
+        if exact:
+            engine = "scan"
+
+        self.centre_arrays = CentreArrays(centres)
+        self.names = self.centre_arrays.names
+        self.engine = engine
+        self.workers = workers
+        self.memory_mb = memory_mb
+        self.exact = exact
+        self.index = None
+
+        if engine == "auto":
+            self.engine = "scan"
+            if len(self.centre_arrays) >= SPATIAL_INDEX_MIN_CENTRES:
+                try:
+                    self._build_index()
+                    self.engine = "index"
+                except ImportError:
+                    self.engine = "tiled"
+        elif engine == "index":
+            self._build_index()
+
+    def _build_index(self):
+        # Imported here so small runs don't pay for loading scipy.
+        from spatial_index import CentreIndex
+
+        self.index = CentreIndex(self.centre_arrays)
+
+    def nearest(self, tutor_lats, tutor_lons, top_n):
+        """Top-N [(rounded_km, centre_index), ...] per tutor (degrees in)."""
+        if self.index is not None:
+            return self.index.nearest(tutor_lats, tutor_lons, top_n)
+        if self.engine == "tiled":
+            return nearest_centres_tiled(
+                tutor_lats,
+                tutor_lons,
+                self.centre_arrays,
+                top_n,
+                memory_mb=self.memory_mb,
+                workers=self.workers,
+            )
+        return nearest_centres(tutor_lats, tutor_lons, self.centre_arrays, top_n, exact=self.exact)
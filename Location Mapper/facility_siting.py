@@ -0,0 +1,218 @@
+"""
+Where to open new centres: greedy max coverage over tutor locations.
+
+Usage: proximity_checker.exe <workbook> --site [3] [--site-km 3] [--venues]
+
+A tutor counts as covered when some centre is within the siting radius.
+Starting from the centres already in Centre Info, each suggested site is
+the one that covers the most tutors not covered yet; the "Suggested
+Sites" sheet lists them in that order with the tutors each one adds.
+
+Candidate sites are the tutors' own locations, thinned to one per grid
+cell (the tutor nearest the middle of the cell's uncovered tutors) so a
+large User Input stays quick, or, with --venues, every row of the
+"Candidate Venues" sheet (laid out like Centre Info). Pairs within the
+radius come from radius_search, so distances use the same engine as
+everything else; the greedy steps then only update the gains of
+candidates near the tutors that were just covered.
+"""
+import math
+
+import numpy as np
+
+from distance_engine import EARTH_RADIUS_KM, CentreMatcher
+from radius_search import centres_within
+
+SITES_SHEET = "Suggested Sites"
+VENUES_SHEET = "Candidate Venues"
+HEADER_ROW = 5
+DATA_START_ROW = 6
+DEFAULT_SITES = 3
+DEFAULT_SITE_KM = 3.0
+# Tutor locations are thinned to at most this many candidate sites.
+MAX_CANDIDATES = 2000
+
+
+def site_headers(radius_km):
+    return [
+        "Rank",
+        "Site",
+        "Postal Code",
+        "Latitude",
+        "Longitude",
+        f"New Tutors within {radius_km:g} km",
+        "Tutors Covered",
+        "Coverage (%)",
+    ]
+
+
+def thin_candidates(lats, lons, weights, radius_km, max_candidates=MAX_CANDIDATES):
+    """
+    Indices of at most max_candidates points, one per grid cell.
+
+    Cells start at half the radius across and double until few enough are
+    occupied. Each cell offers the point nearest the weighted middle of
+    its points.
+    """
+    if len(lats) <= max_candidates:
+        return np.arange(len(lats))
+
+    cos_lat = max(math.cos(math.radians(float(np.mean(lats)))), 0.01)
+    cell_deg = math.degrees(radius_km / 2 / EARTH_RADIUS_KM)
+    while True:
+        rows = np.floor(lats / cell_deg).astype(np.int64)
+        cols = np.floor(lons * cos_lat / cell_deg).astype(np.int64)
+        _, cell = np.unique(np.column_stack((rows, cols)), axis=0, return_inverse=True)
+        cell = cell.ravel()
+        n_cells = int(cell.max()) + 1
+        if n_cells <= max_candidates:
+            break
+        cell_deg *= 2
+
+    total = np.bincount(cell, weights=weights, minlength=n_cells)
+    mid_lat = np.bincount(cell, weights=weights * lats, minlength=n_cells) / total
+    mid_lon = np.bincount(cell, weights=weights * lons, minlength=n_cells) / total
+    offset = (lats - mid_lat[cell]) ** 2 + ((lons - mid_lon[cell]) * cos_lat) ** 2
+    order = np.lexsort((offset, cell))
+    first = np.flatnonzero(np.r_[True, cell[order][1:] != cell[order][:-1]])
+    return np.sort(order[first])
+
+
+def greedy_sites(pair_points, pair_sites, weights, n_candidates, n_sites):
+    """
+    Greedy max coverage. pair_points/pair_sites list every (point, site)
+    within the radius; weights is tutors per point (0 once covered, and
+    updated in place). Returns [(site index, tutors gained), ...].
+    """
+    gains = np.bincount(pair_sites, weights=weights[pair_points], minlength=n_candidates)
+    by_site = np.argsort(pair_sites, kind="stable")
+    site_starts = np.searchsorted(pair_sites[by_site], np.arange(n_candidates + 1))
+    by_point = np.argsort(pair_points, kind="stable")
+    point_starts = np.searchsorted(pair_points[by_point], np.arange(len(weights) + 1))
+
+    chosen = []
+    for _ in range(n_sites):
+        best = int(np.argmax(gains))
+        if gains[best] <= 0:
+            break
+        chosen.append((best, int(round(gains[best]))))
+
+        points = pair_points[by_site[site_starts[best]:site_starts[best + 1]]]
+        points = points[weights[points] > 0]
+        # Every candidate that could also reach these tutors loses them.
+        lengths = point_starts[points + 1] - point_starts[points]
+        spans = np.repeat(point_starts[points], lengths) + (
+            np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        )
+        np.subtract.at(gains, pair_sites[by_point[spans]], np.repeat(weights[points], lengths))
+        weights[points] = 0
+    return chosen
+
+
+def read_venues(book):
+    """Candidate venues from their sheet, as centre dicts."""
+    from proximity_checker import centres_from_rows
+    from workbook_io import read_block
+
+    if VENUES_SHEET not in book.sheet_names():
+        raise ValueError(f"--venues needs a '{VENUES_SHEET}' sheet laid out like Centre Info.")
+    rows = read_block(book, VENUES_SHEET, DATA_START_ROW, 1, 4)
+    postals = {row[0]: row[1] for row in rows if row[0] not in (None, "")}
+    venues = centres_from_rows(rows)
+    for venue in venues:
+        venue["postal"] = postals.get(venue["name"])
+    return venues
+
+
+def suggest_sites(tutors, coordinates, matcher, n_sites=DEFAULT_SITES, radius_km=DEFAULT_SITE_KM, venues=None):
+    """
+    (site rows, tutors located, tutors covered by existing centres).
+
+    matcher covers the existing centres. Without venues, the candidates
+    are the uncovered tutors' locations.
+    """
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    if not found:
+        return [], 0, 0
+    points, first_of, counts = np.unique(
+        np.array([coordinates[i] for i in found], dtype=np.float64), axis=0, return_index=True, return_counts=True
+    )
+    weights = counts.astype(np.float64)
+    lats, lons = points[:, 0], points[:, 1]
+
+    if len(matcher.centre_arrays):
+        covered_points, _, _ = centres_within(lats, lons, matcher, radius_km)
+        weights[covered_points] = 0
+    already = int(len(found) - weights.sum())
+
+    if venues is None:
+        open_points = np.flatnonzero(weights > 0)
+        picks = open_points[thin_candidates(lats[open_points], lons[open_points], weights[open_points], radius_km)]
+        candidates = []
+        for point in picks.tolist():
+            tutor = tutors[found[first_of[point]]]
+            candidates.append(
+                {
+                    "name": f"Near {tutor['name']}",
+                    "postal": tutor["postal"],
+                    "lat": float(lats[point]),
+                    "lon": float(lons[point]),
+                }
+            )
+    else:
+        candidates = venues
+
+    rows = []
+    if candidates:
+        open_points = np.flatnonzero(weights > 0)
+        pair_points, pair_sites, _ = centres_within(
+            lats[open_points], lons[open_points], CentreMatcher(candidates), radius_km
+        )
+        local_weights = weights[open_points]
+        covered = already
+        for rank, (site, gained) in enumerate(
+            greedy_sites(pair_points, pair_sites, local_weights, len(candidates), n_sites), start=1
+        ):
+            covered += gained
+            candidate = candidates[site]
+            rows.append(
+                [
+                    rank,
+                    candidate["name"],
+                    candidate.get("postal"),
+                    round(float(candidate["lat"]), 7),
+                    round(float(candidate["lon"]), 7),
+                    gained,
+                    covered,
+                    round(covered / len(found) * 100, 1),
+                ]
+            )
+    return rows, len(found), already
+
+
+def write_site_suggestions(
+    book,
+    tutors,
+    coordinates,
+    centres,
+    matcher,
+    metrics=None,
+    sites=DEFAULT_SITES,
+    radius_km=DEFAULT_SITE_KM,
+    use_venues=False,
+):
+    """Fill the "Suggested Sites" sheet for one run."""
+    from workbook_io import write_sheet
+
+    venues = read_venues(book) if use_venues else None
+    rows, located, already = suggest_sites(tutors, coordinates, matcher, sites, radius_km, venues)
+    write_sheet(book, SITES_SHEET, HEADER_ROW, site_headers(radius_km), rows)
+
+    if located:
+        covered = rows[-1][6] if rows else already
+        print(
+            f"Tutors within {radius_km:g} km of a centre: {already} of {located} "
+            f"({already / located * 100:.1f}%); with {len(rows)} new sites: {covered} ({covered / located * 100:.1f}%)."
+        )
+    if metrics is not None:
+        metrics.count("suggested_sites", len(rows))
@@ -0,0 +1,291 @@
+import argparse
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+
+GAZETTEER_FILE_NAME = "postal_gazetteer.bin"
+DELTA_SUFFIX = ".delta.csv"
+
+MAGIC = b"SGPC"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # magic, version, record count
+RECORD = struct.Struct("<IddIH")  # postal, lat, lon, address offset, address length
+
+POSTAL_HEADERS = ("postal", "postal code", "postal_code", "postcode")
+LATITUDE_HEADERS = ("latitude", "lat")
+LONGITUDE_HEADERS = ("longitude", "lon", "lng")
+ADDRESS_HEADERS = ("address", "full address")
+
+
+def default_gazetteer_path():
+    """Keep the gazetteer next to the .exe (or the script when run from source)."""
+    if getattr(sys, "frozen", False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, GAZETTEER_FILE_NAME)
+
+
+def write_gazetteer(path, entries):
+    """
+    Write entries {postal: (lat, lon, address)} as a sorted binary file.
+
+    Layout: header, fixed-size records sorted by postal code, then one
+    UTF-8 blob holding every address. Written to a temp file first so a
+    running lookup never sees a half-written gazetteer.
+
+    On Windows a file that another process has memory-mapped cannot be
+    replaced, so the background service has to be stopped first.
+    """
+    codes = sorted(entries, key=int)
+    records = []
+    blob = bytearray()
+
+    for code in codes:
+        lat, lon, address = entries[code]
+        # Cut long addresses on a character boundary, not mid-character.
+        encoded = (address or "").encode("utf-8")[:65535].decode("utf-8", "ignore").encode("utf-8")
+        records.append(RECORD.pack(int(code), lat, lon, len(blob), len(encoded)))
+        blob.extend(encoded)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        f.writelines(records)
+        f.write(blob)
+    try:
+        os.replace(temp_path, path)
+    except PermissionError as e:
+        os.remove(temp_path)
+        raise PermissionError(
+            f"Could not replace {path} because it is in use. If the background service is running, "
+            "stop it first (proximity_checker.exe --stop-service) and try again."
+        ) from e
+
+
+class Gazetteer:
+    """
+    Offline postal code -> (lat, lon, address) lookup.
+
+    The main file is memory-mapped and binary searched, so opening it is
+    instant and each lookup is O(log n). Codes learned from live OneMap
+    hits are appended to a small delta CSV next to it and folded into the
+    main file by the "compact" command.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.delta_path = path + DELTA_SUFFIX
+        self.hits = 0
+        self.misses = 0
+        self.count = 0
+        self._file = None
+        self._map = None
+        self._blob_start = 0
+        self._delta = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path) and os.path.getsize(path) > HEADER.size:
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a postal gazetteer file.")
+            self.count = count
+            self._blob_start = HEADER.size + count * RECORD.size
+
+        if os.path.exists(self.delta_path):
+            self._delta = read_delta(self.delta_path)
+
+    @classmethod
+    def open_default(cls):
+        """Open the gazetteer next to the exe, or return None if there isn't one."""
+        path = default_gazetteer_path()
+        if not os.path.exists(path) and not os.path.exists(path + DELTA_SUFFIX):
+            return None
+        return cls(path)
+
+    def _record(self, index):
+        return RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+
+    def _address(self, offset, length):
+        start = self._blob_start + offset
+        return self._map[start:start + length].decode("utf-8")
+
+    def get(self, postal_code):
+        """Return (lat, lon, address) for a cleaned postal code, or None."""
+        entry = self._delta.get(postal_code)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        if self._map is not None and postal_code.isdigit():
+            target = int(postal_code)
+            low, high = 0, self.count
+            while low < high:
+                mid = (low + high) // 2
+                if self._record(mid)[0] < target:
+                    low = mid + 1
+                else:
+                    high = mid
+
+            if low < self.count:
+                code, lat, lon, offset, length = self._record(low)
+                if code == target:
+                    with self._lock:
+                        self.hits += 1
+                    return lat, lon, self._address(offset, length)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def learn(self, postal_code, lat, lon, address=""):
+        """Remember a code found on OneMap so the next run can skip the API."""
+        with self._lock:
+            if postal_code in self._delta:
+                return
+            self._delta[postal_code] = (lat, lon, address)
+            with open(self.delta_path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow([postal_code, lat, lon, address])
+
+    def entries(self):
+        """All entries (main file plus delta) as {postal: (lat, lon, address)}."""
+        result = {}
+        for index in range(self.count):
+            code, lat, lon, offset, length = self._record(index)
+            result[str(code).zfill(6)] = (lat, lon, self._address(offset, length))
+        result.update(self._delta)
+        return result
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+
+def read_delta(path):
+    """Read the learned-codes CSV written by Gazetteer.learn."""
+    delta = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            try:
+                delta[row[0]] = (float(row[1]), float(row[2]), row[3] if len(row) > 3 else "")
+            except ValueError:
+                continue
+    return delta
+
+
+def find_column(headers, candidates):
+    for i, header in enumerate(headers):
+        if header.strip().lower() in candidates:
+            return i
+    return None
+
+
+def read_csv_dump(csv_path):
+    """
+    Read a postal code dump into {postal: (lat, lon, address)}.
+
+    Needs postal code, latitude and longitude columns; address is optional.
+    OneMap column names (POSTAL, LATITUDE, LONGITUDE, ADDRESS) work as-is.
+    """
+    entries = {}
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        headers = next(reader, [])
+
+        postal_col = find_column(headers, POSTAL_HEADERS)
+        lat_col = find_column(headers, LATITUDE_HEADERS)
+        lon_col = find_column(headers, LONGITUDE_HEADERS)
+        address_col = find_column(headers, ADDRESS_HEADERS)
+
+        if postal_col is None or lat_col is None or lon_col is None:
+            raise ValueError("CSV needs postal code, latitude and longitude columns.")
+
+        for row in reader:
+            try:
+                postal = row[postal_col].strip().split(".")[0].zfill(6)
+                lat = float(row[lat_col])
+                lon = float(row[lon_col])
+            except (IndexError, ValueError):
+                continue
+            if len(postal) != 6 or not postal.isdigit():
+                continue
+            address = row[address_col] if address_col is not None and address_col < len(row) else ""
+            entries[postal] = (lat, lon, address)
+
+    return entries
+
+
+def import_csv(gazetteer_path, csv_path, replace=False):
+    """Build or refresh the gazetteer from a CSV dump. Returns the entry count."""
+    entries = {}
+    if not replace and (os.path.exists(gazetteer_path) or os.path.exists(gazetteer_path + DELTA_SUFFIX)):
+        existing = Gazetteer(gazetteer_path)
+        entries = existing.entries()
+        existing.close()
+
+    entries.update(read_csv_dump(csv_path))
+    write_gazetteer(gazetteer_path, entries)
+
+    if os.path.exists(gazetteer_path + DELTA_SUFFIX):
+        os.remove(gazetteer_path + DELTA_SUFFIX)
+    return len(entries)
+
+
+def compact(gazetteer_path):
+    """Fold learned codes from the delta CSV into the main file."""
+    gazetteer = Gazetteer(gazetteer_path)
+    entries = gazetteer.entries()
+    gazetteer.close()
+
+    write_gazetteer(gazetteer_path, entries)
+    if os.path.exists(gazetteer_path + DELTA_SUFFIX):
+        os.remove(gazetteer_path + DELTA_SUFFIX)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and maintain the offline postal code gazetteer.")
+    parser.add_argument("--path", default=default_gazetteer_path(), help="Gazetteer file to use.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Build or refresh from a CSV dump.")
+    import_parser.add_argument("csv_path")
+    import_parser.add_argument("--replace", action="store_true", help="Drop existing entries first.")
+
+    subparsers.add_parser("compact", help="Merge codes learned from OneMap into the main file.")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Look up a single postal code.")
+    lookup_parser.add_argument("postal_code")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "lookup":
+        gazetteer = Gazetteer(args.path)
+        entry = gazetteer.get(args.postal_code.strip().zfill(6))
+        gazetteer.close()
+        print(entry if entry is not None else "Not in gazetteer.")
+        return
+
+    try:
+        if args.command == "import":
+            count = import_csv(args.path, args.csv_path, replace=args.replace)
+        else:
+            count = compact(args.path)
+    except PermissionError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"Gazetteer now has {count} postal codes: {args.path}")
+
+
+if __name__ == "__main__":
+    main()
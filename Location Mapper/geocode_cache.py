@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+CACHE_FILE_NAME = "geocode_cache.sqlite3"
+FOUND_TTL_DAYS = 180
+NOT_FOUND_TTL_DAYS = 7
+MAX_ENTRIES = 100000
+BUSY_TIMEOUT_SECONDS = 30
+EVICT_CHECK_EVERY = 200
+
+
+def default_cache_path():
+    """Keep the cache next to the .exe (or the script when run from source)."""
+    if getattr(sys, "frozen", False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, CACHE_FILE_NAME)
+
+
+class GeocodeCache:
+    """
+    Persistent postal code -> coordinates cache stored in a SQLite file.
+
+    - Keyed by the cleaned 6-digit postal code
+    - Stores lat/lon, the full OneMap result and when it was fetched
+    - Remembers "not found" codes too, but for a much shorter time
+    - Oldest-used entries are evicted once MAX_ENTRIES is exceeded
+
+    SQLite handles the locking, so two workbooks running the exe at the
+    same time can safely share one cache file.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        found_ttl_days=FOUND_TTL_DAYS,
+        not_found_ttl_days=NOT_FOUND_TTL_DAYS,
+        max_entries=MAX_ENTRIES,
+    ):
+        self.path = path or default_cache_path()
+        self.found_ttl = found_ttl_days * 86400
+        self.not_found_ttl = not_found_ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict_check = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocodes (
+                postal TEXT PRIMARY KEY,
+                found INTEGER NOT NULL,
+                lat REAL,
+                lon REAL,
+                payload TEXT,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_geocodes_last_used ON geocodes (last_used)"
+        )
+
+    def get(self, postal_code):
+        """
+        Return the cached entry for a postal code, or None when there is no
+        usable entry (missing or expired).
+
+        The entry is a dict with found/lat/lon/address/fetched_at.
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT found, lat, lon, payload, fetched_at FROM geocodes WHERE postal = ?",
+                (postal_code,),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            found, lat, lon, payload, fetched_at = row
+            ttl = self.found_ttl if found else self.not_found_ttl
+            if now - fetched_at > ttl:
+                self.misses += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE geocodes SET last_used = ? WHERE postal = ?",
+                (now, postal_code),
+            )
+            self.hits += 1
+
+        return {
+            "found": bool(found),
+            "lat": lat,
+            "lon": lon,
+            "address": json.loads(payload) if payload else None,
+            "fetched_at": fetched_at,
+        }
+
+    def put(self, postal_code, lat, lon, address=None):
+        """Store a successful lookup."""
+        self._write(postal_code, True, lat, lon, address)
+
+    def put_not_found(self, postal_code):
+        """Store a lookup that OneMap returned no results for."""
+        self._write(postal_code, False, None, None, None)
+
+    def _write(self, postal_code, found, lat, lon, address):
+        now = time.time()
+        payload = json.dumps(address) if address is not None else None
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO geocodes
+                    (postal, found, lat, lon, payload, fetched_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (postal_code, int(found), lat, lon, payload, now, now),
+            )
+
+            self._writes_since_evict_check += 1
+            if self._writes_since_evict_check >= EVICT_CHECK_EVERY:
+                self._writes_since_evict_check = 0
+                self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        """Keep the cache under max_entries, dropping expired entries before used ones."""
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()
+        if count <= self.max_entries:
+            return
+
+        count -= self._purge_expired()
+        if count <= self.max_entries:
+            return
+
+        self.conn.execute(
+            """
+            DELETE FROM geocodes WHERE postal IN (
+                SELECT postal FROM geocodes ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (count - self.max_entries,),
+        )
+
+    def _purge_expired(self):
+        """Drop every entry that is past its TTL. Returns how many were dropped."""
+        now = time.time()
+        cursor = self.conn.execute(
+            """
+            DELETE FROM geocodes
+            WHERE (found = 1 AND fetched_at < ?)
+               OR (found = 0 AND fetched_at < ?)
+            """,
+            (now - self.found_ttl, now - self.not_found_ttl),
+        )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._evict_if_needed()
+            self.conn.close()
@@ -0,0 +1,151 @@
+"""
+Interchangeable geocoder backends.
+
+Anything with search(postal_code), close(), reset_stats() and a stats
+attribute can be passed wherever a OneMapClient is expected. search() returns a result
+dict shaped like a OneMap search result (LATITUDE, LONGITUDE, ADDRESS),
+None when the postal code is not found, or raises GeocodeError.
+
+Pick one with a spec string (the --geocoder option):
+
+    onemap                  live OneMap (default)
+    onemap:<url>            OneMap-compatible server, e.g. mock_onemap.py
+    table:<file.csv>        offline lookup table, no network at all
+    record:<file.json>      live OneMap, saving every answer to a cassette
+    replay:<file.json>      answers from a recorded cassette only
+"""
+import json
+import os
+import threading
+import time
+
+from gazetteer import read_csv_dump
+from geocoding import BAD_RESPONSE, GeocodeError, LatencyStats, OneMapClient
+
+DEFAULT_GEOCODER = "onemap"
+GEOCODER_ENV_VAR = "LOCATION_MAPPER_GEOCODER"
+
+
+def onemap_result(postal_code, lat, lon, address=""):
+    """Build a result dict in the same shape OneMap returns."""
+    return {
+        "POSTAL": postal_code,
+        "LATITUDE": str(lat),
+        "LONGITUDE": str(lon),
+        "ADDRESS": address,
+    }
+
+
+class OfflineTableGeocoder:
+    """Answer lookups from a postal code CSV (same columns gazetteer.py imports)."""
+
+    def __init__(self, csv_path):
+        self.entries = read_csv_dump(csv_path)
+        self.stats = LatencyStats()
+
+    def search(self, postal_code):
+        started = time.perf_counter()
+        entry = self.entries.get(postal_code)
+        if entry is None:
+            self.stats.record(time.perf_counter() - started, "not_found")
+            return None
+
+        self.stats.record(time.perf_counter() - started, "found")
+        lat, lon, address = entry
+        return onemap_result(postal_code, lat, lon, address)
+
+    def reset_stats(self):
+        self.stats = LatencyStats()
+
+    def close(self):
+        pass
+
+
+class CassetteGeocoder:
+    """
+    Record/replay wrapper around another geocoder.
+
+    In "record" mode every answer from the inner geocoder (including "not
+    found") is written to a JSON cassette. In "replay" mode only the
+    cassette is used, so a run can be repeated exactly without the network;
+    a postal code missing from the cassette raises GeocodeError.
+    """
+
+    def __init__(self, path, mode="replay", inner=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'. Use record or replay.")
+        if mode == "record" and inner is None:
+            inner = OneMapClient()
+
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.stats = inner.stats if inner is not None and mode == "record" else LatencyStats()
+        self.answers = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.answers = json.load(f)
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+    def search(self, postal_code):
+        if self.mode == "replay":
+            started = time.perf_counter()
+            if postal_code not in self.answers:
+                self.stats.record(time.perf_counter() - started, BAD_RESPONSE)
+                raise GeocodeError(f"{postal_code} is not in the cassette", BAD_RESPONSE)
+            result = self.answers[postal_code]
+            self.stats.record(time.perf_counter() - started, "found" if result else "not_found")
+            return result
+
+        result = self.inner.search(postal_code)
+        with self._lock:
+            self.answers[postal_code] = result
+            self.dirty = True
+        return result
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.answers, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+    def reset_stats(self):
+        # In record mode the inner geocoder does the counting.
+        if self.mode == "record":
+            self.inner.reset_stats()
+            self.stats = self.inner.stats
+        else:
+            self.stats = LatencyStats()
+
+    def close(self):
+        if self.mode == "record":
+            self.save()
+            self.inner.close()
+
+
+def make_geocoder(spec=None):
+    """
+    Create a geocoder from a spec string (see the module docstring).
+
+    Falls back to the LOCATION_MAPPER_GEOCODER environment variable and
+    then to live OneMap, so the .exe can be pointed at a mock server
+    without changing the VBA.
+    """
+    spec = spec or os.environ.get(GEOCODER_ENV_VAR) or DEFAULT_GEOCODER
+    kind, _, target = spec.partition(":")
+
+    if kind == "onemap":
+        return OneMapClient(base_url=target) if target else OneMapClient()
+    if kind == "table":
+        return OfflineTableGeocoder(target)
+    if kind in ("record", "replay"):
+        return CassetteGeocoder(target, mode=kind)
+    raise ValueError(f"Unknown geocoder '{spec}'. Use onemap, onemap:<url>, table:<csv>, record:<json> or replay:<json>.")
@@ -0,0 +1,491 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ONEMAP_SEARCH_URL = "https://www.onemap.gov.sg/api/common/elastic/search"
+NOT_FOUND_TEXT = "Postal code not found"
+LOOKUP_FAILED_TEXT = "Lookup failed"
+
+# OneMap allows 250 calls per minute, so stay a little under that.
+REQUESTS_PER_SECOND = 4.0
+BURST_SIZE = 4
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 4
+REQUEST_TIMEOUT_SECONDS = 10
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+BREAKER_FAILURE_THRESHOLD = 8
+BREAKER_RESET_SECONDS = 30.0
+
+# Error categories reported by GeocodeError.category
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+BAD_RESPONSE = "bad_response"
+CIRCUIT_OPEN = "circuit_open"
+
+TRANSIENT_CATEGORIES = {TIMEOUT, CONNECTION, RATE_LIMITED, SERVER_ERROR}
+
+
+class GeocodeError(Exception):
+    """A OneMap lookup that failed for a reason other than 'not found'."""
+
+    def __init__(self, message, category):
+        super().__init__(message)
+        self.category = category
+
+    @property
+    def transient(self):
+        return self.category in TRANSIENT_CATEGORIES
+
+
+class LookupFailed(tuple):
+    """
+    The (None, None) result of a lookup that kept failing. Callers that
+    only want coordinates treat it like any other miss; category says why
+    it failed, so it can be told apart from a code that does not exist.
+    """
+
+    def __new__(cls, category):
+        failed = super().__new__(cls, (None, None))
+        failed.category = category
+        return failed
+
+    @property
+    def text(self):
+        return f"{LOOKUP_FAILED_TEXT} ({self.category})"
+
+
+def failed_category(text):
+    """The category in a LookupFailed's text, or None for any other cell."""
+    prefix = LOOKUP_FAILED_TEXT + " ("
+    if isinstance(text, str) and text.startswith(prefix) and text.endswith(")"):
+        return text[len(prefix):-1]
+    return None
+
+
+def count_failures(coordinates):
+    """{category: rows} for the lookups in coordinates that failed."""
+    counts = {}
+    for coords in coordinates:
+        if isinstance(coords, LookupFailed):
+            counts[coords.category] = counts.get(coords.category, 0) + 1
+    return counts
+
+
+def report_failures(counts):
+    """Print how many rows could not be looked up, and why."""
+    total = sum(counts.values())
+    if not total:
+        return
+    details = ", ".join(f"{count} {category}" for category, count in sorted(counts.items()))
+    print(f"Could not look up {total} postal codes ({details}); they will be tried again on the next run.")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every geocoding worker.
+
+    The rate drops by half whenever OneMap pushes back (429, 5xx or a
+    timeout) and creeps back up to the configured rate after successes.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST_SIZE, min_rate=0.25):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a request is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def backoff(self, retry_after=None):
+        """Slow down after the API pushed back."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            self.tokens = 0
+
+    def success(self):
+        """Recover the rate a little after each successful request."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+
+class CircuitBreaker:
+    """
+    Stop calling OneMap after too many failures in a row.
+
+    After reset_seconds one trial request is let through; if it succeeds
+    the breaker closes again, otherwise it stays open.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LatencyStats:
+    """Per-request latency and outcome counters for a OneMapClient."""
+
+    def __init__(self):
+        self.latencies = []
+        self.outcomes = {}
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, outcome):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            outcomes = dict(self.outcomes)
+            retries = self.retries
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "requests": len(latencies),
+            "p50_ms": ms(percentile(latencies, 0.50)),
+            "p95_ms": ms(percentile(latencies, 0.95)),
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+            "retries": retries,
+            "outcomes": outcomes,
+        }
+
+
+class OneMapClient:
+    """
+    Reusable OneMap search client.
+
+    - One pooled requests.Session, so connections are kept alive and reused
+      (created on the first lookup, so cache-only runs never load requests)
+    - Shared token bucket to stay under OneMap's rate limit
+    - Jittered exponential backoff retries for timeouts, 429 and 5xx
+    - Circuit breaker so a dead API fails fast instead of being hammered
+    - Latency and outcome stats per request
+    """
+
+    def __init__(
+        self,
+        base_url=ONEMAP_SEARCH_URL,
+        limiter=None,
+        breaker=None,
+        max_attempts=MAX_ATTEMPTS,
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        pool_size=MAX_WORKERS,
+    ):
+        self.base_url = base_url
+        self.limiter = limiter or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.stats = LatencyStats()
+        self.pool_size = pool_size
+        self.session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        with self._session_lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                self.session = session
+            return self.session
+
+    def _request_once(self, postal_code):
+        import requests
+
+        session = self._get_session()
+        params = {"searchVal": postal_code, "returnGeom": "Y", "getAddrDetails": "Y"}
+
+        self.limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.get(self.base_url, params=params, timeout=self.timeout)
+        except requests.Timeout as e:
+            self.stats.record(time.perf_counter() - started, TIMEOUT)
+            self.limiter.backoff()
+            raise GeocodeError(str(e), TIMEOUT) from e
+        except requests.ConnectionError as e:
+            self.stats.record(time.perf_counter() - started, CONNECTION)
+            self.limiter.backoff()
+            raise GeocodeError(str(e), CONNECTION) from e
+        elapsed = time.perf_counter() - started
+
+        if response.status_code == 429:
+            self.stats.record(elapsed, RATE_LIMITED)
+            self.limiter.backoff(parse_retry_after(response))
+            raise GeocodeError("HTTP 429", RATE_LIMITED)
+        if response.status_code >= 500:
+            self.stats.record(elapsed, SERVER_ERROR)
+            self.limiter.backoff(parse_retry_after(response))
+            raise GeocodeError(f"HTTP {response.status_code}", SERVER_ERROR)
+        if response.status_code >= 400:
+            self.stats.record(elapsed, CLIENT_ERROR)
+            raise GeocodeError(f"HTTP {response.status_code}", CLIENT_ERROR)
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            self.stats.record(elapsed, BAD_RESPONSE)
+            raise GeocodeError("Response was not valid JSON", BAD_RESPONSE) from e
+
+        self.limiter.success()
+        if data.get("found", 0) > 0 and data.get("results"):
+            self.stats.record(elapsed, "found")
+            return data["results"][0]
+
+        self.stats.record(elapsed, "not_found")
+        return None
+
+    def search(self, postal_code):
+        """
+        Look up one cleaned postal code on OneMap.
+
+        Returns the first search result dict, or None when OneMap has no match.
+        Raises GeocodeError when the lookup fails after all retries.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                raise GeocodeError("OneMap is failing repeatedly, skipping lookup", CIRCUIT_OPEN)
+            if attempt > 1:
+                self.stats.record_retry()
+
+            try:
+                result = self._request_once(postal_code)
+            except GeocodeError as e:
+                # Every failure counts towards the breaker, but only
+                # transient ones are worth retrying.
+                self.breaker.record_failure()
+                if not e.transient:
+                    raise
+                if attempt == self.max_attempts:
+                    raise
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def reset_stats(self):
+        """Start a fresh LatencyStats, e.g. for each job of the warm service."""
+        self.stats = LatencyStats()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+def parse_retry_after(response):
+    """Read the Retry-After header in seconds, if OneMap sent one."""
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """One shared client per process so every caller shares the same pool and budget."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OneMapClient()
+        return _default_client
+
+
+def lookup_postal_code(postal_code, cache=None, client=None, gazetteer=None):
+    """
+    Get (lat, lon) for one cleaned postal code.
+
+    Checks the offline gazetteer, then the cache, and only then OneMap.
+    Returns (None, None) when the code is blank or not found, and a
+    LookupFailed when OneMap keeps failing.
+    """
+    if not postal_code:
+        return None, None
+
+    if gazetteer is not None:
+        entry = gazetteer.get(postal_code)
+        if entry is not None:
+            return entry[0], entry[1]
+
+    if cache is not None:
+        cached = cache.get(postal_code)
+        if cached is not None:
+            return cached["lat"], cached["lon"]
+
+    client = client or get_default_client()
+    try:
+        result = client.search(postal_code)
+    except GeocodeError as e:
+        print(f"Error fetching postal code {postal_code} ({e.category}): {e}")
+        return LookupFailed(e.category)
+
+    if result is None:
+        if cache is not None:
+            cache.put_not_found(postal_code)
+        return None, None
+
+    lat, lon = float(result["LATITUDE"]), float(result["LONGITUDE"])
+    if cache is not None:
+        cache.put(postal_code, lat, lon, result)
+    if gazetteer is not None:
+        gazetteer.learn(postal_code, lat, lon, result.get("ADDRESS", ""))
+    return lat, lon
+
+
+def unique_postal_codes(postal_codes):
+    """Return the distinct non-blank postal codes, in first-seen order."""
+    return list(dict.fromkeys(code for code in postal_codes if code))
+
+
+def report_duplicates(postal_codes):
+    """Print how many lookups deduplication saves for a list of postal codes."""
+    non_blank = sum(1 for code in postal_codes if code)
+    if not non_blank:
+        return
+    unique = len(unique_postal_codes(postal_codes))
+    print(
+        f"{unique} unique postal codes across {non_blank} rows "
+        f"({(non_blank - unique) / non_blank:.0%} duplicates skipped)."
+    )
+
+
+def geocode_many(
+    postal_codes,
+    cache=None,
+    client=None,
+    gazetteer=None,
+    max_workers=MAX_WORKERS,
+    progress=None,
+    report=True,
+):
+    """
+    Geocode a list of cleaned postal codes concurrently.
+
+    Each distinct postal code is looked up only once and the result is
+    copied back to every row that uses it, so duplicates cost nothing.
+
+    Returns a list of (lat, lon) tuples in the same order as postal_codes
+    (LookupFailed for codes whose lookup kept failing).
+    progress, if given, is called as progress(done, total) after each
+    unique code. Set report=False when the caller prints its own
+    duplicate summary (e.g. when geocoding a sheet in chunks).
+    """
+    client = client or get_default_client()
+    unique_codes = unique_postal_codes(postal_codes)
+    total = len(unique_codes)
+    done = 0
+    done_lock = threading.Lock()
+
+    if report:
+        report_duplicates(postal_codes)
+
+    def worker(postal_code):
+        nonlocal done
+        coords = lookup_postal_code(postal_code, cache, client, gazetteer)
+        if progress is not None:
+            with done_lock:
+                done += 1
+                progress(done, total)
+        return coords
+
+    coords_by_code = {}
+    if unique_codes:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            coords_by_code = dict(zip(unique_codes, executor.map(worker, unique_codes)))
+
+    return [coords_by_code.get(code, (None, None)) for code in postal_codes]
+
+
+def print_client_stats(client):
+    """Print a one-line summary of the OneMap requests made by a client."""
+    stats = client.stats.summary()
+    if not stats["requests"]:
+        return
+    outcomes = ", ".join(f"{name} {count}" for name, count in sorted(stats["outcomes"].items()))
+    print(
+        f"OneMap: {stats['requests']} requests, p50 {stats['p50_ms']} ms, "
+        f"p95 {stats['p95_ms']} ms, {stats['retries']} retries ({outcomes})."
+    )
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+STATE_SUFFIX = ".proximity_state.json"
+STATE_VERSION = 1
+
+
+def state_path_for(workbook_path):
+    """Sidecar file next to the workbook (or inside a CSV folder)."""
+    if os.path.isdir(workbook_path):
+        return os.path.join(workbook_path, "proximity_state.json")
+    return os.path.splitext(workbook_path)[0] + STATE_SUFFIX
+
+
+def fingerprint(value):
+    """Short stable hash of any JSON-serialisable value."""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def tutor_fingerprint(tutor):
+    return fingerprint([tutor["name"], tutor["postal"]])
+
+
+def centres_fingerprint(centres, top_n):
+    return fingerprint([top_n, [[c["name"], c["lat"], c["lon"]] for c in centres]])
+
+
+def load_state(path):
+    """Read the sidecar, or return an empty state if it is missing or unreadable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {"version": STATE_VERSION, "centres": None, "rows": {}}
+
+    if state.get("version") != STATE_VERSION:
+        return {"version": STATE_VERSION, "centres": None, "rows": {}}
+    return state
+
+
+def save_state(path, centres_hash, rows_by_fingerprint):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": STATE_VERSION, "centres": centres_hash, "rows": rows_by_fingerprint}, f)
+    os.replace(temp_path, path)
+
+
+def normalize_cell(value):
+    """
+    Make a cell value comparable with what was written.
+
+    Excel hands numbers back as floats and may turn "310123" into 310123.0,
+    so numbers and numeric strings are compared as text.
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def changed_runs(current_rows, new_rows):
+    """
+    Yield (start_index, rows) for each contiguous run of rows in new_rows
+    that differs from current_rows.
+    """
+    start = None
+    for index, row in enumerate(new_rows):
+        current = list(current_rows[index]) if index < len(current_rows) else []
+        current = (current + [None] * len(row))[:len(row)]
+        same = [normalize_cell(v) for v in current] == [normalize_cell(v) for v in row]
+        if not same and start is None:
+            start = index
+        elif same and start is not None:
+            yield start, new_rows[start:index]
+            start = None
+    if start is not None:
+        yield start, new_rows[start:]
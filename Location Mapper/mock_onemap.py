@@ -0,0 +1,172 @@
+"""
+Local stand-in for the OneMap search API, for testing without the internet.
+
+Usage: python mock_onemap.py [--port 8765] [--latency-ms 50] [--error-rate 0.05] [--throttle-rate 0.02]
+
+Serves /api/common/elastic/search with the same response shape as OneMap.
+Every valid 6-digit postal code gets made-up but stable coordinates inside
+Singapore; codes ending in NOT_FOUND_SUFFIX come back as "not found".
+Latency, 5xx errors and 429 throttling can be dialled in to exercise the
+client's retry, backoff and circuit breaker. Point the tools at it with:
+
+    --geocoder onemap:http://127.0.0.1:8765/api/common/elastic/search
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/api/common/elastic/search"
+NOT_FOUND_SUFFIX = "999"
+
+# Rough bounding box of mainland Singapore.
+LAT_RANGE = (1.24, 1.47)
+LON_RANGE = (103.62, 104.03)
+
+
+def fake_coordinates(postal_code):
+    """Stable coordinates for a postal code, spread over the bounding box."""
+    value = int(postal_code)
+    lat = LAT_RANGE[0] + (value % 1000) / 1000 * (LAT_RANGE[1] - LAT_RANGE[0])
+    lon = LON_RANGE[0] + (value // 1000 % 1000) / 1000 * (LON_RANGE[1] - LON_RANGE[0])
+    return round(lat, 7), round(lon, 7)
+
+
+def search_response(postal_code):
+    """The JSON body OneMap would send for a search on postal_code."""
+    if len(postal_code) != 6 or not postal_code.isdigit() or postal_code.endswith(NOT_FOUND_SUFFIX):
+        return {"found": 0, "totalNumPages": 0, "pageNum": 1, "results": []}
+
+    lat, lon = fake_coordinates(postal_code)
+    return {
+        "found": 1,
+        "totalNumPages": 1,
+        "pageNum": 1,
+        "results": [
+            {
+                "SEARCHVAL": f"MOCK BUILDING {postal_code}",
+                "BLK_NO": str(int(postal_code) % 900 + 1),
+                "ROAD_NAME": "MOCK ROAD",
+                "BUILDING": f"MOCK BUILDING {postal_code}",
+                "ADDRESS": f"{int(postal_code) % 900 + 1} MOCK ROAD SINGAPORE {postal_code}",
+                "POSTAL": postal_code,
+                "X": "0",
+                "Y": "0",
+                "LATITUDE": str(lat),
+                "LONGITUDE": str(lon),
+            }
+        ],
+    }
+
+
+class MockSettings:
+    """Behaviour knobs shared by every request handler thread."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def next_roll(self):
+        with self._lock:
+            self.requests += 1
+            return self.random.random(), self.random.uniform(-1, 1)
+
+
+def make_handler(settings):
+    class MockOneMapHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            encoded = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != SEARCH_PATH:
+                self.send_json(404, {"error": "Not found"})
+                return
+
+            roll, jitter = settings.next_roll()
+            delay_ms = max(0.0, settings.latency_ms + jitter * settings.jitter_ms)
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+
+            if roll < settings.throttle_rate:
+                self.send_json(429, {"error": "Too many requests"}, {"Retry-After": str(settings.retry_after)})
+                return
+            if roll < settings.throttle_rate + settings.error_rate:
+                self.send_json(503, {"error": "Service unavailable"})
+                return
+
+            postal_code = parse_qs(url.query).get("searchVal", [""])[0].strip()
+            self.send_json(200, search_response(postal_code))
+
+    return MockOneMapHandler
+
+
+def start_server(host="127.0.0.1", port=0, **settings):
+    """
+    Start the mock server on a background thread.
+
+    Returns (server, search_url). Call server.shutdown() to stop it.
+    Keyword arguments are passed to MockSettings.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(MockSettings(**settings)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}{SEARCH_PATH}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the OneMap search API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- spread around --latency-ms.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for repeatable error/429 patterns.")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(
+            MockSettings(
+                latency_ms=args.latency_ms,
+                jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate,
+                throttle_rate=args.throttle_rate,
+                retry_after=args.retry_after,
+                seed=args.seed,
+            )
+        ),
+    )
+    server.daemon_threads = True
+    print(f"Mock OneMap listening on http://{args.host}:{server.server_port}{SEARCH_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
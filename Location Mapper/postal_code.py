@@ -1,65 +1,123 @@
-import sys
-import requests
-import time
-import xlwings as xw
+import argparse
+import json
+import os
+from gazetteer import Gazetteer
+from geocode_cache import GeocodeCache
+from geocoder_backends import make_geocoder
+from geocoding import (
+    count_failures,
+    geocode_many,
+    print_client_stats,
+    report_duplicates,
+    report_failures,
+)
+from incremental import fingerprint
+from postal_validation import (
+    REASON_TEXT,
+    count_rejections,
+    is_rejected,
+    normalize_postal_codes,
+    report_rejections,
+)
+from workbook_io import BACKENDS, DEFAULT_BACKEND, open_workbook, read_header
 
 HEADER_ROW = 5
 DATA_START_ROW = 6
+CHECKPOINT_EVERY_ROWS = 500
+# Rows with invalid postal codes listed in the console before "... and N more".
+MAX_INVALID_ROWS_LISTED = 20
+PROGRESS_SUFFIX = ".postal_progress.json"
+
+
+def write_coordinates(book, sheet, first_row, latitude_col, longitude_col, coordinates):
+    """Write a block of (lat, lon) pairs with as few range writes as possible."""
+    if longitude_col == latitude_col + 1:
+        book.write_range(sheet, first_row, latitude_col, [[lat, lon] for lat, lon in coordinates])
+    elif latitude_col == longitude_col + 1:
+        book.write_range(sheet, first_row, longitude_col, [[lon, lat] for lat, lon in coordinates])
+    else:
+        book.write_range(sheet, first_row, latitude_col, [[lat] for lat, _ in coordinates])
+        book.write_range(sheet, first_row, longitude_col, [[lon] for _, lon in coordinates])
 
 
-def get_coordinates(postal_code):
-    postal_code = str(postal_code).strip().replace(".0", "").zfill(6)
-
-    url = (
-        "https://www.onemap.gov.sg/api/common/elastic/search"
-        f"?searchVal={postal_code}&returnGeom=Y&getAddrDetails=Y"
-    )
-
-    response = requests.get(url, timeout=10)
-    data = response.json()
-    time.sleep(0.3)
-
-    if data.get("found", 0) > 0:
-        result = data["results"][0]
-        return result["LATITUDE"], result["LONGITUDE"]
-    else:
-        return None, None
+def contiguous_runs(indices):
+    """Group sorted row indices into (first, last) runs of consecutive rows."""
+    runs = []
+    for index in indices:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return [tuple(run) for run in runs]
 
 
-def get_open_book_by_fullname(workbook_path):
-    normalized_target = workbook_path.lower()
+def report_invalid_rows(postals, reasons):
+    """List the rows whose postal code was rejected, so they can be fixed."""
+    rows = [
+        (DATA_START_ROW + i, postal, reason)
+        for i, (postal, reason) in enumerate(zip(postals, reasons))
+        if is_rejected(reason)
+    ]
+    for row, postal, reason in rows[:MAX_INVALID_ROWS_LISTED]:
+        print(f"Row {row}: invalid postal code '{postal}' ({REASON_TEXT[reason]}), coordinates left blank.")
+    if len(rows) > MAX_INVALID_ROWS_LISTED:
+        print(f"... and {len(rows) - MAX_INVALID_ROWS_LISTED} more rows with invalid postal codes.")
 
-    for app in xw.apps:
-        for book in app.books:
-            try:
-                if book.fullname and book.fullname.lower() == normalized_target:
-                    return book, False
-            except Exception:
-                continue
 
-    app = xw.App(visible=False, add_book=False)
-    app.display_alerts = False
-    app.screen_updating = False
-    book = app.books.open(workbook_path)
-    return book, True
+def progress_path_for(workbook_path):
+    return os.path.splitext(workbook_path)[0] + PROGRESS_SUFFIX
 
 
-def run_postal_coordinates(workbook_path):
-    book, should_close = get_open_book_by_fullname(workbook_path)
+def load_progress(path, column_hash):
+    """
+    Return the last completed row offset from an earlier interrupted run,
+    or None if there is nothing to resume (or the postal codes changed).
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if progress.get("column_hash") != column_hash:
+        print("Postal codes changed since the interrupted run, starting from the top.")
+        return None
+    return progress.get("completed_through")
+
+
+def save_progress(path, column_hash, completed_through):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"column_hash": column_hash, "completed_through": completed_through}, f)
+    os.replace(temp_path, path)
+
+
+def clear_progress(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def run_postal_coordinates(
+    workbook_path,
+    backend=DEFAULT_BACKEND,
+    fill_missing=False,
+    resume=False,
+    checkpoint_every=CHECKPOINT_EVERY_ROWS,
+    geocoder=None,
+):
+    book = open_workbook(workbook_path, backend)
+    cache = GeocodeCache()
+    client = make_geocoder(geocoder)
+    gazetteer = Gazetteer.open_default()
 
     try:
-        sheet = book.sheets[0]
+        sheet = book.sheet_names()[0]
 
         # ========================
         # READ HEADERS (ROW 5)
         # ========================
-        last_col = sheet.used_range.last_cell.column
-        headers = sheet.range((HEADER_ROW, 1), (HEADER_ROW, last_col)).value
-
-        if not isinstance(headers, list):
-            headers = [headers]
-
-        headers = [str(h).strip() if h is not None else "" for h in headers]
+        headers = read_header(book, sheet, HEADER_ROW)
+        last_col = len(headers)
 
         if "Postal Code" not in headers:
             raise ValueError("Could not find a 'Postal Code' column in row 5.")
@@ -73,7 +131,7 @@ def run_postal_coordinates(workbook_path):
             latitude_col = headers.index("Latitude") + 1
         else:
             latitude_col = last_col + 1
-            sheet.cells(HEADER_ROW, latitude_col).value = "Latitude"
+            book.write_range(sheet, HEADER_ROW, latitude_col, [["Latitude"]])
             last_col += 1
             headers.append("Latitude")
 
@@ -81,51 +139,172 @@ def run_postal_coordinates(workbook_path):
             longitude_col = headers.index("Longitude") + 1
         else:
             longitude_col = last_col + 1
-            sheet.cells(HEADER_ROW, longitude_col).value = "Longitude"
+            book.write_range(sheet, HEADER_ROW, longitude_col, [["Longitude"]])
 
         # ========================
         # FIND LAST ROW BASED ON POSTAL COLUMN
         # ========================
-        last_row = sheet.cells(sheet.rows.count, postal_col).end("up").row
+        last_row = book.last_row(sheet, postal_col)
 
         if last_row < DATA_START_ROW:
             print("No data rows found.")
             return
 
-        total_rows = last_row - (DATA_START_ROW - 1)
-
         # ========================
-        # MAIN LOOP
+        # READ POSTAL CODES (ONE RANGE)
         # ========================
-        for i, row_num in enumerate(range(DATA_START_ROW, last_row + 1), start=1):
-            postal = sheet.cells(row_num, postal_col).value
+        postals = [row[0] for row in book.read_range(sheet, DATA_START_ROW, postal_col, last_row, postal_col)]
+        cleaned, reasons = normalize_postal_codes(postals)
+        invalid = {i for i, reason in enumerate(reasons) if is_rejected(reason)}
+        lookups = ["" if i in invalid else code for i, code in enumerate(cleaned)]
+        total_rows = len(cleaned)
+        report_duplicates(lookups)
+        report_rejections(count_rejections(reasons))
+        report_invalid_rows(postals, reasons)
 
-            if postal in (None, ""):
-                sheet.cells(row_num, latitude_col).value = None
-                sheet.cells(row_num, longitude_col).value = None
-                print(f"Checked {i} out of {total_rows}")
-                continue
-
-            lat, lon = get_coordinates(str(postal))
-
-            sheet.cells(row_num, latitude_col).value = lat
-            sheet.cells(row_num, longitude_col).value = lon
+        # ========================
+        # PICK ROWS TO PROCESS
+        # ========================
+        pending = list(range(total_rows))
+
+        if fill_missing:
+            existing_lat = book.read_range(sheet, DATA_START_ROW, latitude_col, last_row, latitude_col)
+            existing_lon = book.read_range(sheet, DATA_START_ROW, longitude_col, last_row, longitude_col)
+            missing = [
+                i for i in pending
+                if existing_lat[i][0] in (None, "") or existing_lon[i][0] in (None, "")
+            ]
+            print(f"{total_rows - len(missing)} rows already have coordinates, skipping them.")
+            # Invalid codes can never be filled in, so they are not rewritten on every run.
+            pending = [i for i in missing if i not in invalid]
+
+        progress_path = progress_path_for(workbook_path)
+        column_hash = fingerprint(cleaned)
+        if resume:
+            completed_through = load_progress(progress_path, column_hash)
+            if completed_through is not None:
+                pending = [i for i in pending if i > completed_through]
+                print(f"Resuming after row {DATA_START_ROW + completed_through}.")
 
-            print(f"Checked {i} out of {total_rows}")
+        # ========================
+        # GEOCODE + WRITE + CHECKPOINT IN BLOCKS
+        # ========================
+        failures = {}
+        for start in range(0, len(pending), checkpoint_every):
+            chunk = pending[start:start + checkpoint_every]
+            coordinates = geocode_many(
+                [lookups[i] for i in chunk],
+                cache=cache,
+                client=client,
+                gazetteer=gazetteer,
+                report=False,
+            )
+            for category, count in count_failures(coordinates).items():
+                failures[category] = failures.get(category, 0) + count
+            coords_by_index = dict(zip(chunk, coordinates))
+            for run_start, run_end in contiguous_runs(chunk):
+                write_coordinates(
+                    book,
+                    sheet,
+                    DATA_START_ROW + run_start,
+                    latitude_col,
+                    longitude_col,
+                    [coords_by_index[i] for i in range(run_start, run_end + 1)],
+                )
+
+            book.save()
+            save_progress(progress_path, column_hash, chunk[-1])
+            print(f"Checked {start + len(chunk)} out of {len(pending)} (saved)")
 
         book.save()
+        clear_progress(progress_path)
+        report_failures(failures)
+        if gazetteer is not None:
+            print(f"Gazetteer: {gazetteer.hits} hits, {gazetteer.misses} misses.")
+        print(f"Geocode cache: {cache.hits} hits, {cache.misses} misses.")
+        print_client_stats(client)
         print("Done!")
 
     finally:
-        if should_close:
-            app = book.app
-            book.close()
-            app.quit()
+        cache.close()
+        client.close()
+        if gazetteer is not None:
+            gazetteer.close()
+        book.close()
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        raise SystemExit("Usage: postal_coordinates_xlwings.exe <full_workbook_path>")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="postal_coordinates_xlwings.exe",
+        description="Fill in Latitude/Longitude for every postal code in the first sheet.",
+    )
+    parser.add_argument("workbook_path", nargs="?", help="Full path to the workbook (or a CSV file).")
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="How to read and write the workbook. Use openpyxl or csv to run without Excel.",
+    )
+    parser.add_argument(
+        "--fill-missing",
+        action="store_true",
+        help="Skip rows that already have both Latitude and Longitude.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue after the last checkpoint of an interrupted run.",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=CHECKPOINT_EVERY_ROWS,
+        help="Save the workbook and progress after this many rows.",
+    )
+    parser.add_argument(
+        "--geocoder",
+        default=None,
+        help="Where postal codes are looked up: onemap (default), onemap:<url>, "
+        "table:<csv>, record:<json> or replay:<json>.",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report how long start-up and each deferred import take, then exit.",
+    )
+    args = parser.parse_args(argv)
+
+    if not (args.profile_startup or args.workbook_path):
+        parser.error("workbook_path is required")
+    if args.checkpoint_every < 1:
+        parser.error("--checkpoint-every must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.profile_startup:
+        from startup_profile import backend_step, print_startup_profile
+
+        print_startup_profile(
+            "postal_code",
+            [
+                backend_step(args.backend),
+                ("OneMap client (requests, cache misses only)", "requests"),
+            ],
+        )
+        return
+
+    run_postal_coordinates(
+        args.workbook_path,
+        args.backend,
+        fill_missing=args.fill_missing,
+        resume=args.resume,
+        checkpoint_every=args.checkpoint_every,
+        geocoder=args.geocoder,
+    )
+
 
-    workbook_path = sys.argv[1]
-    run_postal_coordinates(workbook_path)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Postal code normalisation and validation.
+
+Cells come back from Excel as ints (leading zero lost), floats
+(310123.0), or text with stray spaces and non-breaking spaces. Everything
+is turned into a 6-digit string and checked before any lookup, so codes
+that cannot exist never cost a OneMap call.
+"""
+import math
+import re
+
+INVALID_POSTAL_TEXT = "Invalid postal code"
+
+# The first two digits are the postal sector: 01 to 82, except 74.
+VALID_SECTORS = frozenset(f"{sector:02d}" for sector in range(1, 83) if sector != 74)
+
+# Rejection reasons returned alongside each code.
+BLANK = "blank"
+NOT_NUMERIC = "not_numeric"
+WRONG_LENGTH = "wrong_length"
+INVALID_SECTOR = "invalid_sector"
+
+REASON_TEXT = {
+    NOT_NUMERIC: "not a whole number",
+    WRONG_LENGTH: "more than 6 digits",
+    INVALID_SECTOR: "no such postal sector",
+}
+
+# Digits, optionally with a decimal point and zeros only ("310123.0").
+NUMERIC_TEXT = re.compile(r"(\d+)(?:\.0*)?")
+# \s also matches non-breaking spaces (U+00A0) pasted in from web pages.
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_postal_code(value):
+    """
+    Return (postal_code, reason) for one raw cell value.
+
+    A valid code comes back as a 6-digit string with reason None. Blank
+    cells give ("", BLANK). Anything else gives the tidied text and the
+    reason it was rejected.
+    """
+    if value is None:
+        return "", BLANK
+
+    if isinstance(value, bool):
+        return str(value), NOT_NUMERIC
+    if isinstance(value, float):
+        if not math.isfinite(value) or not value.is_integer() or value < 0:
+            return str(value), NOT_NUMERIC
+        digits = str(int(value))
+    elif isinstance(value, int):
+        if value < 0:
+            return str(value), NOT_NUMERIC
+        digits = str(value)
+    else:
+        text = WHITESPACE.sub("", str(value))
+        if not text:
+            return "", BLANK
+        match = NUMERIC_TEXT.fullmatch(text)
+        if match is None:
+            return text, NOT_NUMERIC
+        digits = match.group(1)
+
+    digits = digits.lstrip("0")
+    if len(digits) > 6:
+        return digits, WRONG_LENGTH
+
+    postal_code = digits.zfill(6)
+    if postal_code[:2] not in VALID_SECTORS:
+        return postal_code, INVALID_SECTOR
+    return postal_code, None
+
+
+def normalize_postal_codes(values):
+    """
+    Normalise a whole column in one pass.
+
+    Each distinct cell value is only parsed once, which is most of the
+    work on real sheets where the same postal codes repeat. Returns
+    (postal_codes, reasons), two lists in the same order as values.
+    """
+    parsed = {}
+    postal_codes = []
+    reasons = []
+    for value in values:
+        # The type is part of the key so 1, 1.0 and True stay apart.
+        key = (type(value), value)
+        result = parsed.get(key)
+        if result is None:
+            result = normalize_postal_code(value)
+            parsed[key] = result
+        postal_codes.append(result[0])
+        reasons.append(result[1])
+    return postal_codes, reasons
+
+
+def is_rejected(reason):
+    """True for codes that were filled in but cannot be a real postal code."""
+    return reason is not None and reason != BLANK
+
+
+def count_rejections(reasons):
+    counts = {}
+    for reason in reasons:
+        if is_rejected(reason):
+            counts[reason] = counts.get(reason, 0) + 1
+    return counts
+
+
+def report_rejections(counts):
+    """Print how many codes were skipped as invalid, and why."""
+    total = sum(counts.values())
+    if not total:
+        return
+    details = ", ".join(f"{count} {REASON_TEXT[reason]}" for reason, count in sorted(counts.items()))
+    print(f"Skipped {total} invalid postal codes without looking them up ({details}).")
@@ -1,48 +1,49 @@
+import argparse
+import functools
 import sys
-import time
-import requests
-import xlwings as xw
-from math import radians, sin, cos, sqrt, atan2
+from math import atan2, cos, radians, sin, sqrt
+from gazetteer import Gazetteer
+from geocode_cache import GeocodeCache
+from geocoder_backends import make_geocoder
+from geocoding import (
+    NOT_FOUND_TEXT,
+    LookupFailed,
+    failed_category,
+    geocode_many,
+    print_client_stats,
+    report_failures,
+)
+from incremental import (
+    centres_fingerprint,
+    changed_runs,
+    load_state,
+    save_state,
+    state_path_for,
+    tutor_fingerprint,
+)
+from postal_validation import (
+    INVALID_POSTAL_TEXT,
+    count_rejections,
+    is_rejected,
+    normalize_postal_codes,
+    report_rejections,
+)
+from run_metrics import ProgressReporter, RunMetrics
+from workbook_io import BACKENDS, DEFAULT_BACKEND, open_workbook, read_block
 
 TOP_N = 3
+# Nearest centres each tutor may be assigned to with --assign.
+DEFAULT_ASSIGN_CANDIDATES = 5
+# New centre locations suggested with --site.
+DEFAULT_SITES = 3
 USER_INPUT_SHEET = "User Input"
 CENTRE_INFO_SHEET = "Centre Info"
 OUTPUT_SHEET = "Output"
 DATA_START_ROW = 6
-
-
-def clean_postal_code(postal_code):
-    """Turn the postal code into a clean 6-digit string."""
-    if postal_code is None:
-        return ""
-    return str(postal_code).strip().replace(".0", "").zfill(6)
-
-
-def get_coordinates(postal_code):
-    """Get latitude and longitude from the OneMap API."""
-    postal_code = clean_postal_code(postal_code)
-    if not postal_code:
-        return None, None
-
-    url = (
-        "https://www.onemap.gov.sg/api/common/elastic/search"
-        f"?searchVal={postal_code}&returnGeom=Y&getAddrDetails=Y"
-    )
-
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        time.sleep(0.3)
-
-        if data.get("found", 0) > 0 and data.get("results"):
-            result = data["results"][0]
-            return float(result["LATITUDE"]), float(result["LONGITUDE"])
-
-        return None, None
-    except Exception as e:
-        print(f"Error fetching postal code {postal_code}: {e}")
-        return None, None
+OUTPUT_COLUMNS = 2 + TOP_N * 2
+OUTPUT_HEADERS = ["Name", "Postal Code"] + [
+    header for rank in range(1, TOP_N + 1) for header in (f"Centre {rank}", f"Distance {rank} (km)")
+]
 
 
 def haversine_km(lat1, lon1, lat2, lon2):
@@ -55,37 +56,21 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return radius_km * 2 * atan2(sqrt(a), sqrt(1 - a))
 
 
-def get_open_book_by_fullname(workbook_path):
-    """Try to attach to a workbook that is already open in Excel."""
-    normalized_target = workbook_path.lower()
-
-    for app in xw.apps:
-        for book in app.books:
-            try:
-                if book.fullname and book.fullname.lower() == normalized_target:
-                    return book, False
-            except Exception:
-                continue
-
-    app = xw.App(visible=False, add_book=False)
-    app.display_alerts = False
-    app.screen_updating = False
-    book = app.books.open(workbook_path)
-    return book, True
+def read_centres(book, with_capacity=False):
+    """
+    Read centres from the Centre Info sheet. Column E (capacity) is only
+    read when with_capacity is set, i.e. for --assign.
+    """
+    last_col = 5 if with_capacity else 4
+    return centres_from_rows(read_block(book, CENTRE_INFO_SHEET, DATA_START_ROW, 1, last_col))
 
 
-def read_centres(ws_centres):
-    """Read centres from the Centre Info sheet."""
-    last_row = ws_centres.range((ws_centres.cells.last_cell.row, 1)).end("up").row
-    if last_row < DATA_START_ROW:
-        return []
-
-    rows = ws_centres.range(f"A{DATA_START_ROW}:D{last_row}").value
-    if not isinstance(rows, list):
-        return []
-    if rows and not isinstance(rows[0], list):
-        rows = [rows]
-
+def centres_from_rows(rows):
+    """
+    Turn Centre Info rows (name, postal, lat, lon[, capacity]) into centre
+    dicts. "capacity" is only set when rows have a fifth column; it is None
+    (no limit) when the cell is blank or not a number.
+    """
     centres = []
     for row in rows:
         centre_name = row[0]
@@ -97,83 +82,135 @@ def read_centres(ws_centres):
         if centre_lat in (None, "") or centre_lon in (None, ""):
             continue
 
-        centres.append(
-            {
-                "name": centre_name,
-                "lat": float(centre_lat),
-                "lon": float(centre_lon),
-            }
-        )
+        centre = {
+            "name": centre_name,
+            "lat": float(centre_lat),
+            "lon": float(centre_lon),
+        }
+        if len(row) > 4:
+            centre["capacity"] = parse_capacity(centre_name, row[4])
+        centres.append(centre)
 
     return centres
 
 
-def read_tutors(ws_input):
+def parse_capacity(centre_name, value):
+    """Capacity from a Centre Info cell, or None for no limit."""
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        print(f"Centre '{centre_name}': capacity '{value}' is not a number, treating it as no limit.")
+        return None
+
+
+def read_tutors(book):
     """Read tutors from the User Input sheet."""
-    last_row = ws_input.range((ws_input.cells.last_cell.row, 1)).end("up").row
-    if last_row < DATA_START_ROW:
-        return []
+    return tutors_from_rows(read_block(book, USER_INPUT_SHEET, DATA_START_ROW, 1, 2))
 
-    rows = ws_input.range(f"A{DATA_START_ROW}:B{last_row}").value
-    if not isinstance(rows, list):
-        return []
-    if rows and not isinstance(rows[0], list):
-        rows = [rows]
 
-    tutors = []
-    for row in rows:
-        tutor_name = row[0]
-        tutor_postal = row[1]
+def tutors_from_rows(rows):
+    """
+    Turn User Input rows (name, postal) into tutor dicts.
 
-        if tutor_name in (None, ""):
-            continue
+    Postal codes are normalised as a whole column; "invalid" marks codes
+    that were filled in but cannot exist, so they are never looked up.
+    """
+    named_rows = [row for row in rows if row[0] not in (None, "")]
+    postals, reasons = normalize_postal_codes([row[1] for row in named_rows])
 
+    tutors = []
+    for row, postal, reason in zip(named_rows, postals, reasons):
         tutors.append(
             {
-                "name": tutor_name,
-                "postal": clean_postal_code(tutor_postal),
+                "name": row[0],
+                "postal": postal,
+                "invalid": is_rejected(reason),
+                "reason": reason,
             }
         )
 
     return tutors
 
 
-def build_results(tutors, centres):
-    """Get tutor coordinates, calculate distances, and prepare output rows."""
-    results = []
+def lookup_codes(tutors):
+    """Postal codes to geocode, with invalid ones blanked so they never reach OneMap."""
+    return ["" if tutor["invalid"] else tutor["postal"] for tutor in tutors]
 
-    for index, tutor in enumerate(tutors, start=1):
-        print(f"Processing {index} of {len(tutors)}: {tutor['name']} ({tutor['postal']})")
-
-        lat, lon = get_coordinates(tutor["postal"])
-
-        if lat is None or lon is None:
-            results.append(
-                [
-                    tutor["name"],
-                    tutor["postal"],
-                    "Postal code not found",
-                    None,
-                    None,
-                    None,
-                    None,
-                    None,
-                ]
-            )
-            continue
 
-        distances = []
-        for centre in centres:
-            distance_km = haversine_km(lat, lon, centre["lat"], centre["lon"])
-            distances.append((centre["name"], round(distance_km, 2)))
+def not_found_row(tutor):
+    """Output row for a tutor whose postal code could not be geocoded."""
+    return [tutor["name"], tutor["postal"], NOT_FOUND_TEXT] + [None] * (TOP_N * 2 - 1)
+
+
+def failed_row(tutor, failure):
+    """Output row for a tutor whose lookup kept failing, e.g. "Lookup failed (timeout)"."""
+    return [tutor["name"], tutor["postal"], failure.text] + [None] * (TOP_N * 2 - 1)
+
+
+def needs_retry(row):
+    """True for Output rows that should be looked up again on the next run."""
+    return row[2] == NOT_FOUND_TEXT or failed_category(row[2]) is not None
+
+
+def count_failed_rows(results):
+    """{category: rows} for Output rows whose lookup failed."""
+    counts = {}
+    for row in results:
+        category = failed_category(row[2])
+        if category is not None:
+            counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+def invalid_row(tutor):
+    """Output row for a tutor whose postal code cannot be a real one."""
+    return [tutor["name"], tutor["postal"], INVALID_POSTAL_TEXT] + [None] * (TOP_N * 2 - 1)
+
+
+def make_matcher(centres, exact=False):
+    """Build a CentreMatcher. NumPy is only loaded once there is something to match."""
+    from distance_engine import CentreMatcher
+
+    return CentreMatcher(centres, exact=exact)
+
+
+def match_centres(tutors, coordinates, centres, matcher=None):
+    """
+    Build output rows from already-geocoded tutors.
+
+    Pass a prebuilt CentreMatcher when calling this repeatedly (e.g. per
+    chunk) so the centre arrays and index are only built once.
+    """
+    matcher = matcher or make_matcher(centres)
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    matches = matcher.nearest(
+        [coordinates[i][0] for i in found],
+        [coordinates[i][1] for i in found],
+        TOP_N,
+    )
+    matches_by_index = dict(zip(found, matches))
+
+    results = []
+    for index, tutor in enumerate(tutors):
+        if tutor["invalid"]:
+            results.append(invalid_row(tutor))
+            continue
 
-        distances.sort(key=lambda item: item[1])
-        top_matches = distances[:TOP_N]
+        top_matches = matches_by_index.get(index)
+        if top_matches is None:
+            if isinstance(coordinates[index], LookupFailed):
+                results.append(failed_row(tutor, coordinates[index]))
+            else:
+                results.append(not_found_row(tutor))
+            continue
 
         output_row = [tutor["name"], tutor["postal"]]
         for i in range(TOP_N):
             if i < len(top_matches):
-                output_row.extend([top_matches[i][0], top_matches[i][1]])
+                distance_km, centre_index = top_matches[i]
+                output_row.extend([matcher.names[centre_index], distance_km])
             else:
                 output_row.extend([None, None])
 
@@ -182,47 +219,462 @@ def build_results(tutors, centres):
     return results
 
 
-def write_results(ws_output, results):
+def geocode_tutors(tutors, cache=None, client=None, gazetteer=None, metrics=None):
+    """(lat, lon) for every tutor, (None, None) where there is none."""
+    metrics = metrics or RunMetrics()
+    with metrics.phase("geocode"):
+        return geocode_many(
+            lookup_codes(tutors),
+            cache=cache,
+            client=client,
+            gazetteer=gazetteer,
+            progress=ProgressReporter("Geocoded", listener=metrics.record_progress),
+        )
+
+
+def build_results(tutors, centres, cache=None, client=None, gazetteer=None, metrics=None, matcher=None):
+    """Get tutor coordinates, calculate distances, and prepare output rows."""
+    metrics = metrics or RunMetrics()
+    coordinates = geocode_tutors(tutors, cache, client, gazetteer, metrics)
+    with metrics.phase("distances"):
+        return match_centres(tutors, coordinates, centres, matcher)
+
+
+def write_results(book, results):
     """Clear old rows and write the new output rows."""
-    last_used_row = ws_output.range((ws_output.cells.last_cell.row, 1)).end("up").row
+    last_used_row = book.last_row(OUTPUT_SHEET, 1)
     clear_to_row = max(last_used_row, DATA_START_ROW)
-    ws_output.range(f"A{DATA_START_ROW}:H{clear_to_row}").clear_contents()
+    book.clear_range(OUTPUT_SHEET, DATA_START_ROW, 1, clear_to_row, OUTPUT_COLUMNS)
+    book.write_range(OUTPUT_SHEET, DATA_START_ROW, 1, results)
+
+
+def patch_results(book, results):
+    """
+    Write only the Output rows that differ from what is already there, and
+    clear any leftover rows below the new results.
+    """
+    last_used_row = book.last_row(OUTPUT_SHEET, 1)
+    current_rows = []
+    if last_used_row >= DATA_START_ROW:
+        current_rows = book.read_range(OUTPUT_SHEET, DATA_START_ROW, 1, last_used_row, OUTPUT_COLUMNS)
+
+    patched = 0
+    for start, rows in changed_runs(current_rows, results):
+        book.write_range(OUTPUT_SHEET, DATA_START_ROW + start, 1, rows)
+        patched += len(rows)
+
+    first_stale_row = DATA_START_ROW + len(results)
+    if last_used_row >= first_stale_row:
+        book.clear_range(OUTPUT_SHEET, first_stale_row, 1, last_used_row, OUTPUT_COLUMNS)
+
+    return patched
+
+
+def build_results_incremental(
+    workbook_path,
+    tutors,
+    centres,
+    cache=None,
+    client=None,
+    gazetteer=None,
+    metrics=None,
+    matcher=None,
+):
+    """
+    Reuse stored results for tutor rows that haven't changed since the last
+    run, and only geocode/match the new or edited ones. Everything is
+    recomputed when Centre Info changes.
+    """
+    state_path = state_path_for(workbook_path)
+    state = load_state(state_path)
+    centres_hash = centres_fingerprint(centres, TOP_N)
+
+    known_rows = state["rows"]
+    if state["centres"] != centres_hash:
+        if state["centres"] is not None:
+            print("Centre Info has changed, recomputing every row.")
+        known_rows = {}
+
+    fingerprints = [tutor_fingerprint(tutor) for tutor in tutors]
+    todo = [i for i, fp in enumerate(fingerprints) if fp not in known_rows]
+    print(f"{len(tutors) - len(todo)} rows unchanged, {len(todo)} new or changed rows to compute.")
+
+    fresh = build_results([tutors[i] for i in todo], centres, cache, client, gazetteer, metrics, matcher)
+    fresh_by_index = dict(zip(todo, fresh))
+
+    results = [fresh_by_index[i] if i in fresh_by_index else known_rows[fp] for i, fp in enumerate(fingerprints)]
+
+    # Not-found and failed rows are left out so they are retried on the next run.
+    save_state(
+        state_path,
+        centres_hash,
+        {fp: row for fp, row in zip(fingerprints, results) if not needs_retry(row)},
+    )
+    return results
 
-    if results:
-        end_row = DATA_START_ROW + len(results) - 1
-        ws_output.range(f"A{DATA_START_ROW}:H{end_row}").value = results
 
+def analyses_for(options):
+    """
+    (phase name, function) for each extra sheet asked for in options.
+
+    options is a plain dict (see run_options) so it can be sent to
+    the background service as JSON. Each function is called as
+    function(book, tutors, coordinates, centres, matcher, metrics).
+    """
+    analyses = []
+    if options.get("radius_km") is not None:
+        from radius_search import write_radius_sheets
+
+        analyses.append(("radius", functools.partial(write_radius_sheets, radius_km=options["radius_km"])))
+    if options.get("reverse_top_n"):
+        from reverse_lookup import write_centre_ranking
+
+        analyses.append(("reverse", functools.partial(write_centre_ranking, top_n=options["reverse_top_n"])))
+    if options.get("coverage_bands_km") is not None:
+        from centre_coverage import DEFAULT_BANDS_KM, write_coverage_sheets
+
+        analyses.append(
+            (
+                "coverage",
+                functools.partial(
+                    write_coverage_sheets,
+                    bands_km=options["coverage_bands_km"] or DEFAULT_BANDS_KM,
+                    unserved_km=options.get("unserved_km"),
+                ),
+            )
+        )
+    if options.get("assign_candidates"):
+        from capacity_assignment import write_assignment_sheets
 
-def run_distance_checker(workbook_path):
+        analyses.append(
+            ("assign", functools.partial(write_assignment_sheets, candidates=options["assign_candidates"]))
+        )
+    if options.get("sites"):
+        from facility_siting import DEFAULT_SITE_KM, write_site_suggestions
+
+        analyses.append(
+            (
+                "siting",
+                functools.partial(
+                    write_site_suggestions,
+                    sites=options["sites"],
+                    radius_km=options.get("site_km") or DEFAULT_SITE_KM,
+                    use_venues=bool(options.get("venues")),
+                ),
+            )
+        )
+    return analyses
+
+
+def process_workbook(
+    book,
+    workbook_path,
+    cache,
+    client,
+    gazetteer=None,
+    incremental=False,
+    metrics=None,
+    matcher_for=make_matcher,
+    options=None,
+):
+    """
+    Read the workbook, calculate results, write them back and log the run.
+
+    The cache, client and gazetteer are used as given and left open, so a
+    long-running service can keep them warm between jobs. matcher_for
+    builds (or reuses) the CentreMatcher for a list of centres. options
+    adds extra sheets (see analyses_for) and can ask for exact-only
+    distances.
+    """
+    metrics = metrics or RunMetrics()
+    options = options or {}
+    analyses = analyses_for(options)
+    cache_before = (cache.hits, cache.misses)
+    gazetteer_before = (gazetteer.hits, gazetteer.misses) if gazetteer is not None else (0, 0)
+
+    with metrics.phase("read"):
+        centres = read_centres(book, with_capacity=bool(options.get("assign_candidates")))
+        tutors = read_tutors(book)
+
+    print(f"Loaded {len(centres)} centres.")
+    print(f"Loaded {len(tutors)} tutors.")
+    rejections = count_rejections(tutor["reason"] for tutor in tutors)
+    report_rejections(rejections)
+
+    matcher = matcher_for(centres, bool(options.get("exact")))
+    coordinates = None
+    if incremental:
+        results = build_results_incremental(workbook_path, tutors, centres, cache, client, gazetteer, metrics, matcher)
+    else:
+        coordinates = geocode_tutors(tutors, cache, client, gazetteer, metrics)
+        with metrics.phase("distances"):
+            results = match_centres(tutors, coordinates, centres, matcher)
+
+    if analyses and coordinates is None:
+        # Unchanged rows were geocoded by an earlier run, so these are cache hits.
+        coordinates = geocode_tutors(tutors, cache, client, gazetteer, metrics)
+    for name, analysis in analyses:
+        with metrics.phase(name):
+            analysis(book, tutors, coordinates, centres, matcher, metrics)
+
+    with metrics.phase("write"):
+        if incremental:
+            patched = patch_results(book, results)
+        else:
+            write_results(book, results)
+        book.save()
+    if incremental:
+        print(f"Updated {patched} Output rows.")
+
+    metrics.count("rows", len(tutors))
+    metrics.count("centres", len(centres))
+    failures = count_failed_rows(results)
+    report_failures(failures)
+    metrics.count("not_found", sum(1 for row in results if row[2] == NOT_FOUND_TEXT))
+    metrics.count("lookup_failed", sum(failures.values()))
+    metrics.details["lookup_failures"] = failures
+    metrics.count("invalid", sum(rejections.values()))
+    metrics.details["rejections"] = rejections
+    metrics.count("cache_hits", cache.hits - cache_before[0])
+    metrics.count("cache_misses", cache.misses - cache_before[1])
+    if gazetteer is not None:
+        metrics.count("gazetteer_hits", gazetteer.hits - gazetteer_before[0])
+        metrics.count("gazetteer_misses", gazetteer.misses - gazetteer_before[1])
+        print(f"Gazetteer: {metrics.counters['gazetteer_hits']} hits, {metrics.counters['gazetteer_misses']} misses.")
+    print(f"Geocode cache: {metrics.counters['cache_hits']} hits, {metrics.counters['cache_misses']} misses.")
+    print_client_stats(client)
+
+    metrics.details["geocoder"] = client.stats.summary()
+    metrics.details["incremental"] = incremental
+    metrics.details["options"] = options
+    print(metrics.summary_line())
+    try:
+        json_path, _ = metrics.write(workbook_path)
+        print(f"Run log written to {json_path}")
+    except OSError as e:
+        print(f"Could not write the run log: {e}")
+
+    print("Done. Output sheet has been updated.")
+    return metrics
+
+
+def run_distance_checker(workbook_path, backend=DEFAULT_BACKEND, incremental=False, geocoder=None, options=None):
     """Main function that reads the workbook, calculates results, and writes them back."""
-    book, should_close = get_open_book_by_fullname(workbook_path)
+    book = open_workbook(workbook_path, backend)
+    cache = GeocodeCache()
+    client = make_geocoder(geocoder)
+    gazetteer = Gazetteer.open_default()
 
     try:
-        ws_centres = book.sheets[CENTRE_INFO_SHEET]
-        ws_input = book.sheets[USER_INPUT_SHEET]
-        ws_output = book.sheets[OUTPUT_SHEET]
+        process_workbook(book, workbook_path, cache, client, gazetteer, incremental, options=options)
+    finally:
+        cache.close()
+        client.close()
+        if gazetteer is not None:
+            gazetteer.close()
+        book.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="proximity_checker.exe",
+        description="Find the closest centres for every tutor in a workbook.",
+    )
+    parser.add_argument("workbook_path", nargs="?", help="Full path to the workbook (or a folder of CSV sheets).")
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="How to read and write the workbook. Use openpyxl or csv to run without Excel.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only recompute rows that changed since the last run and patch those Output rows.",
+    )
+    parser.add_argument(
+        "--geocoder",
+        default=None,
+        help="Where postal codes are looked up: onemap (default), onemap:<url>, "
+        "table:<csv>, record:<json> or replay:<json>.",
+    )
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=None,
+        metavar="KM",
+        help="Also list every centre within KM of each tutor on the 'Within Radius' and 'Radius Counts' sheets.",
+    )
+    parser.add_argument(
+        "--reverse",
+        type=int,
+        nargs="?",
+        const=TOP_N,
+        default=None,
+        metavar="N",
+        help=f"Also rank the N (default {TOP_N}) closest tutors to each centre on the 'Centre Ranking' sheet.",
+    )
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        nargs="*",
+        default=None,
+        metavar="KM",
+        help="Also count tutors per centre within each distance band (default 1 3 5 km) on the 'Coverage' "
+        "sheet, and list tutors with no centre nearby on 'Unserved Tutors'.",
+    )
+    parser.add_argument(
+        "--unserved-km",
+        type=float,
+        default=None,
+        metavar="KM",
+        help="With --coverage: tutors with no centre within KM are unserved (default: the largest band).",
+    )
+    parser.add_argument(
+        "--assign",
+        type=int,
+        nargs="?",
+        const=DEFAULT_ASSIGN_CANDIDATES,
+        default=None,
+        metavar="K",
+        help="Also give each tutor one centre within the capacities in Centre Info column E, choosing among "
+        f"their K (default {DEFAULT_ASSIGN_CANDIDATES}) nearest centres, on the 'Assignment', "
+        "'Unassigned Tutors' and 'Centre Load' sheets.",
+    )
+    parser.add_argument(
+        "--site",
+        type=int,
+        nargs="?",
+        const=DEFAULT_SITES,
+        default=None,
+        metavar="N",
+        help=f"Also suggest N (default {DEFAULT_SITES}) new centre locations that bring the most tutors "
+        "within --site-km of a centre, on the 'Suggested Sites' sheet.",
+    )
+    parser.add_argument(
+        "--site-km",
+        type=float,
+        default=None,
+        metavar="KM",
+        help="With --site: how close a centre must be for a tutor to count as covered (default 3).",
+    )
+    parser.add_argument(
+        "--venues",
+        action="store_true",
+        help="With --site: choose among the 'Candidate Venues' sheet instead of tutor locations.",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Run the full Haversine formula on every tutor-centre pair (slower; for auditing the results).",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Start the warm background service instead of processing a workbook.",
+    )
+    parser.add_argument(
+        "--stop-service",
+        action="store_true",
+        help="Stop a running background service.",
+    )
+    parser.add_argument(
+        "--no-service",
+        action="store_true",
+        help="Always run in this process, even if the background service is running.",
+    )
+    parser.add_argument("--port", type=int, default=None, help="Port of the background service (default 8766).")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report how long start-up and each deferred import take, then exit.",
+    )
+    args = parser.parse_args(argv)
+
+    if not (args.serve or args.stop_service or args.profile_startup or args.workbook_path):
+        parser.error("workbook_path is required")
+    if args.radius is not None and args.radius <= 0:
+        parser.error("--radius must be more than 0")
+    if args.reverse is not None and args.reverse < 1:
+        parser.error("--reverse must be at least 1")
+    if args.coverage is not None and any(band <= 0 for band in args.coverage):
+        parser.error("--coverage bands must be more than 0")
+    if args.unserved_km is not None and args.coverage is None:
+        parser.error("--unserved-km needs --coverage")
+    if args.assign is not None and args.assign < 1:
+        parser.error("--assign must be at least 1")
+    if args.site is not None and args.site < 1:
+        parser.error("--site must be at least 1")
+    if args.site_km is not None and args.site_km <= 0:
+        parser.error("--site-km must be more than 0")
+    if (args.site_km is not None or args.venues) and args.site is None:
+        parser.error("--site-km and --venues need --site")
+    return args
+
+
+def run_options(args):
+    """Per-run options from the command line, for process_workbook."""
+    options = {}
+    if args.radius is not None:
+        options["radius_km"] = args.radius
+    if args.reverse is not None:
+        options["reverse_top_n"] = args.reverse
+    if args.coverage is not None:
+        options["coverage_bands_km"] = args.coverage
+        if args.unserved_km is not None:
+            options["unserved_km"] = args.unserved_km
+    if args.assign is not None:
+        options["assign_candidates"] = args.assign
+    if args.site is not None:
+        options["sites"] = args.site
+        if args.site_km is not None:
+            options["site_km"] = args.site_km
+        if args.venues:
+            options["venues"] = True
+    if args.exact:
+        options["exact"] = True
+    return options
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.profile_startup:
+        from startup_profile import backend_step, print_startup_profile
+
+        print_startup_profile(
+            "proximity_checker",
+            [
+                backend_step(args.backend),
+                ("OneMap client (requests, cache misses only)", "requests"),
+                ("distance engine (numpy)", "distance_engine"),
+                ("spatial index (scipy, 500+ centres only)", "spatial_index"),
+            ],
+        )
+        return
+    if args.serve:
+        from service import serve
 
-        centres = read_centres(ws_centres)
-        tutors = read_tutors(ws_input)
+        serve(args.port, args.geocoder)
+        return
+    if args.stop_service:
+        from service_client import stop_service
 
-        print(f"Loaded {len(centres)} centres.")
-        print(f"Loaded {len(tutors)} tutors.")
+        print("Service stopped." if stop_service(args.port) else "No service was running.")
+        return
 
-        results = build_results(tutors, centres)
-        write_results(ws_output, results)
+    options = run_options(args)
 
-        book.save()
-        print("Done. Output sheet has been updated.")
-    finally:
-        if should_close:
-            app = book.app
-            book.close()
-            app.quit()
+    # A custom geocoder only applies to this run, so it never goes to the service.
+    if not args.no_service and args.geocoder is None:
+        from service_client import run_via_service
 
+        outcome = run_via_service(args.workbook_path, args.backend, args.incremental, args.port, options)
+        if outcome is not None:
+            sys.exit(0 if outcome else 1)
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        raise SystemExit("Usage: proximity_checker.exe <full_workbook_path>")
+    run_distance_checker(args.workbook_path, args.backend, args.incremental, args.geocoder, options)
 
-    workbook_path = sys.argv[1]
-    run_distance_checker(workbook_path)
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Every centre within a radius of each tutor, instead of a fixed Top 3.
+
+Usage: proximity_checker.exe <workbook> --radius 3
+
+Writes one (tutor, centre, distance) row per pair within the radius to
+the "Within Radius" sheet, nearest first, and how many centres each
+tutor has to "Radius Counts". Far-away centres are never scored: the
+KD-tree from spatial_index (or, for fewer centres, a latitude/longitude
+bounding box) narrows each tutor down before the exact Haversine check.
+"""
+import math
+
+import numpy as np
+
+from distance_engine import EARTH_RADIUS_KM, haversine_rad
+from geocoding import NOT_FOUND_TEXT, LookupFailed
+from postal_validation import INVALID_POSTAL_TEXT
+
+RADIUS_SHEET = "Within Radius"
+RADIUS_COUNTS_SHEET = "Radius Counts"
+HEADER_ROW = 5
+DEFAULT_RADIUS_KM = 3.0
+RADIUS_HEADERS = ["Name", "Postal Code", "Centre", "Distance (km)"]
+
+# Tutors scored per block, so dense areas never build one huge pair list.
+BLOCK_TUTORS = 4096
+
+
+def count_headers(radius_km):
+    return ["Name", "Postal Code", f"Centres within {radius_km:g} km"]
+
+
+def box_candidates(lat_rad, lon_rad, centre_arrays, order, radius_km):
+    """
+    Bounding-box prefilter: (tutor positions, centre indices) of centres
+    whose latitude and longitude are both close enough to be within
+    radius_km. order sorts the centres by latitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    sorted_lat = centre_arrays.lat[order]
+    first = np.searchsorted(sorted_lat, lat_rad - angle, side="left")
+    last = np.searchsorted(sorted_lat, lat_rad + angle, side="right")
+    counts = last - first
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    tutors = np.repeat(np.arange(len(lat_rad)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    centres = order[np.repeat(first, counts) + offsets]
+
+    # Widest longitude gap that can still be within the radius, taken at
+    # the highest latitude either point can have.
+    max_lat = np.minimum(np.abs(lat_rad) + angle, math.pi / 2)[tutors]
+    with np.errstate(divide="ignore"):
+        ratio = math.sin(min(angle, math.pi) / 2) / np.cos(max_lat)
+    max_dlon = np.where(ratio >= 1, math.pi, 2 * np.arcsin(np.minimum(ratio, 1)))
+    dlon = np.abs((centre_arrays.lon[centres] - lon_rad[tutors] + math.pi) % (2 * math.pi) - math.pi)
+    keep = dlon <= max_dlon * (1 + 1e-9) + 1e-12
+    return tutors[keep], centres[keep]
+
+
+def centres_within(tutor_lats, tutor_lons, matcher, radius_km):
+    """
+    All (tutor, centre, km) pairs with km <= radius_km.
+
+    tutor_lats/tutor_lons are degrees; matcher is a CentreMatcher, whose
+    KD-tree is used when it has one. Returns three arrays sorted by tutor,
+    then rounded distance, then Centre Info order.
+    """
+    lat_rad = np.radians(np.asarray(tutor_lats, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(tutor_lons, dtype=np.float64))
+    centre_arrays = matcher.centre_arrays
+    order = np.argsort(centre_arrays.lat, kind="stable") if matcher.index is None else None
+
+    parts = []
+    for start in range(0, len(lat_rad), BLOCK_TUTORS):
+        lat = lat_rad[start:start + BLOCK_TUTORS]
+        lon = lon_rad[start:start + BLOCK_TUTORS]
+        if len(centre_arrays) == 0:
+            break
+        if matcher.index is not None:
+            tutors, centres = matcher.index.candidates_within(lat, lon, radius_km)
+        else:
+            tutors, centres = box_candidates(lat, lon, centre_arrays, order, radius_km)
+
+        km = haversine_rad(
+            lat[tutors],
+            lon[tutors],
+            centre_arrays.lat[centres],
+            centre_arrays.lon[centres],
+            centre_arrays.cos_lat[centres],
+        )
+        keep = km <= radius_km
+        parts.append((tutors[keep] + start, centres[keep], km[keep]))
+
+    if not parts:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+    tutors, centres, km = (np.concatenate(column) for column in zip(*parts))
+    order = np.lexsort((centres, np.round(km, 2), tutors))
+    return tutors[order], centres[order], km[order]
+
+
+def radius_results(tutors, coordinates, matcher, radius_km):
+    """
+    (pair rows, count rows) for the two radius sheets.
+
+    Tutors without coordinates get the usual not-found, failed or invalid
+    text in place of a count and no pair rows.
+    """
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    pair_tutors, pair_centres, pair_km = centres_within(
+        [coordinates[i][0] for i in found],
+        [coordinates[i][1] for i in found],
+        matcher,
+        radius_km,
+    )
+    counts = np.bincount(pair_tutors, minlength=len(found)).tolist()
+    count_by_index = dict(zip(found, counts))
+
+    pair_rows = []
+    for position, centre_index, km in zip(pair_tutors.tolist(), pair_centres.tolist(), pair_km.tolist()):
+        tutor = tutors[found[position]]
+        pair_rows.append([tutor["name"], tutor["postal"], matcher.names[centre_index], round(km, 2)])
+
+    count_rows = []
+    for index, tutor in enumerate(tutors):
+        if tutor["invalid"]:
+            count = INVALID_POSTAL_TEXT
+        elif isinstance(coordinates[index], LookupFailed):
+            count = coordinates[index].text
+        else:
+            count = count_by_index.get(index, NOT_FOUND_TEXT)
+        count_rows.append([tutor["name"], tutor["postal"], count])
+    return pair_rows, count_rows
+
+
+def write_radius_sheets(book, tutors, coordinates, centres, matcher, metrics=None, radius_km=DEFAULT_RADIUS_KM):
+    """Fill the "Within Radius" and "Radius Counts" sheets for one run."""
+    from workbook_io import write_sheet
+
+    pair_rows, count_rows = radius_results(tutors, coordinates, matcher, radius_km)
+    written = write_sheet(book, RADIUS_SHEET, HEADER_ROW, RADIUS_HEADERS, pair_rows)
+    write_sheet(book, RADIUS_COUNTS_SHEET, HEADER_ROW, count_headers(radius_km), count_rows)
+
+    print(f"Found {len(pair_rows)} tutor-centre pairs within {radius_km:g} km.")
+    if written < len(pair_rows):
+        print(
+            f"Only the first {written} fit on the '{RADIUS_SHEET}' sheet; "
+            "use stream_matcher.py --radius to write them all to a file."
+        )
+    if metrics is not None:
+        metrics.count("radius_pairs", len(pair_rows))
@@ -0,0 +1,56 @@
+"""
+The closest tutors to each centre: the Output sheet the other way round.
+
+Usage: proximity_checker.exe <workbook> --reverse 5
+
+Uses the tutor coordinates the run has just looked up, so it costs no
+extra OneMap calls, and the same distance engine with the tutors as the
+points being searched (a KD-tree over tutors once there are enough of
+them). Ranking follows the Output sheet's rules: distances rounded to 2
+decimals, ties in User Input order.
+"""
+from distance_engine import CentreMatcher
+
+CENTRE_RANKING_SHEET = "Centre Ranking"
+HEADER_ROW = 5
+DEFAULT_TOP_N = 3
+
+
+def ranking_headers(top_n):
+    return ["Centre"] + [
+        header for rank in range(1, top_n + 1) for header in (f"Tutor {rank}", f"Distance {rank} (km)")
+    ]
+
+
+def nearest_tutors(tutors, coordinates, centres, top_n):
+    """
+    One row per centre: its name, then the top_n nearest tutors and their
+    distances. Tutors without coordinates are left out.
+    """
+    found = [i for i, (lat, lon) in enumerate(coordinates) if lat is not None and lon is not None]
+    points = [{"name": tutors[i]["name"], "lat": coordinates[i][0], "lon": coordinates[i][1]} for i in found]
+    matcher = CentreMatcher(points)
+    matches = matcher.nearest([centre["lat"] for centre in centres], [centre["lon"] for centre in centres], top_n)
+
+    rows = []
+    for centre, top_matches in zip(centres, matches):
+        row = [centre["name"]]
+        for i in range(top_n):
+            if i < len(top_matches):
+                distance_km, tutor_index = top_matches[i]
+                row.extend([matcher.names[tutor_index], distance_km])
+            else:
+                row.extend([None, None])
+        rows.append(row)
+    return rows
+
+
+def write_centre_ranking(book, tutors, coordinates, centres, matcher, metrics=None, top_n=DEFAULT_TOP_N):
+    """Fill the "Centre Ranking" sheet for one run."""
+    from workbook_io import write_sheet
+
+    rows = nearest_tutors(tutors, coordinates, centres, top_n)
+    write_sheet(book, CENTRE_RANKING_SHEET, HEADER_ROW, ranking_headers(top_n), rows)
+    print(f"Ranked the {top_n} closest tutors for {len(rows)} centres.")
+    if metrics is not None:
+        metrics.count("ranked_centres", len(rows))
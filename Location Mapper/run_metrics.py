@@ -0,0 +1,147 @@
+import contextlib
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+RUN_LOG_SUFFIX = ".run_log"
+PROGRESS_INTERVAL_SECONDS = 2.0
+PHASES = ("read", "geocode", "distances", "write")
+
+
+def run_log_paths(workbook_path):
+    """(json_path, csv_path) next to the workbook (or inside a CSV folder)."""
+    if os.path.isdir(workbook_path):
+        base = os.path.join(workbook_path, "run_log")
+    else:
+        base = os.path.splitext(workbook_path)[0] + RUN_LOG_SUFFIX
+    return base + ".json", base + ".csv"
+
+
+class ProgressReporter:
+    """
+    Progress callback for geocode_many that prints at most once every
+    interval_seconds, with the current rate and an ETA, instead of one
+    line per row.
+    """
+
+    def __init__(self, label, interval_seconds=PROGRESS_INTERVAL_SECONDS, listener=None):
+        self.label = label
+        self.interval = interval_seconds
+        self.listener = listener
+        self.started_at = time.monotonic()
+        self.last_printed_at = None
+        self._lock = threading.Lock()
+
+    def __call__(self, done, total):
+        if self.listener is not None:
+            self.listener(done, total)
+
+        with self._lock:
+            now = time.monotonic()
+            finished = done >= total
+            if not finished and self.last_printed_at is not None and now - self.last_printed_at < self.interval:
+                return
+            if self.last_printed_at is None and not finished and now - self.started_at < self.interval:
+                return
+            self.last_printed_at = now
+
+        elapsed = now - self.started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if finished:
+            print(f"{self.label} {done} of {total} in {elapsed:.1f}s ({rate:.0f}/s)")
+        else:
+            eta = (total - done) / rate if rate > 0 else 0.0
+            print(f"{self.label} {done} of {total} ({rate:.0f}/s, ETA {eta:.0f}s)")
+
+
+class RunMetrics:
+    """Wall-clock time per phase plus counters for one run."""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.phase_seconds = {}
+        self.counters = {}
+        self.details = {}
+        self.current_phase = None
+        self.progress = None
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        self.current_phase = name
+        try:
+            yield
+        finally:
+            self.current_phase = None
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def record_progress(self, done, total):
+        self.progress = (done, total)
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def total_seconds(self):
+        return time.perf_counter() - self._started
+
+    def to_dict(self):
+        total = self.total_seconds()
+        rows = self.counters.get("rows", 0)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "total_seconds": round(total, 3),
+            "rows_per_sec": round(rows / total, 1) if total > 0 else None,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phase_seconds.items()},
+            "counters": dict(self.counters),
+            **self.details,
+        }
+
+    def summary_line(self):
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.phase_seconds.items())
+        rows = self.counters.get("rows", 0)
+        total = self.total_seconds()
+        rate = rows / total if total > 0 else 0.0
+        return f"Timings: {phases} (total {total:.1f}s, {rate:.0f} rows/s)."
+
+    def write(self, workbook_path):
+        """
+        Save this run next to the workbook: the full detail as JSON (latest
+        run only) and one summary row appended to a CSV history.
+        """
+        json_path, csv_path = run_log_paths(workbook_path)
+        report = self.to_dict()
+
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        geocoder = report.get("geocoder", {})
+        row = {
+            "started_at": report["started_at"],
+            "total_seconds": report["total_seconds"],
+            "rows": report["counters"].get("rows", 0),
+            "rows_per_sec": report["rows_per_sec"],
+        }
+        for name in PHASES:
+            row[f"{name}_seconds"] = report["phases"].get(name)
+        for name in ("cache_hits", "cache_misses", "gazetteer_hits", "not_found", "invalid"):
+            row[name] = report["counters"].get(name, 0)
+        for name in ("requests", "p50_ms", "p95_ms", "p99_ms", "retries"):
+            row[f"geocode_{name}"] = geocoder.get(name)
+        row["geocode_failed_requests"] = sum(
+            count for outcome, count in geocoder.get("outcomes", {}).items() if outcome not in ("found", "not_found")
+        )
+        # Last, so older history files keep their columns lined up.
+        row["lookup_failed"] = report["counters"].get("lookup_failed", 0)
+
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+        return json_path, csv_path
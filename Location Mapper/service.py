@@ -0,0 +1,427 @@
+"""
+Warm background service for proximity_checker.
+
+Start it once (proximity_checker.exe --serve, or python service.py) and
+every button click is forwarded to it instead of starting a fresh
+process. The interpreter, the OneMap connection pool, the geocode cache,
+the gazetteer and the centre index all stay loaded between runs.
+
+Listens on 127.0.0.1 only. At start-up a random secret is written to a
+token file that only the current user can read (see service_client), and
+every request must send it in the X-Service-Token header. POST bodies
+must be sent as application/json.
+
+    GET  /health            {"status": "ok", ...}
+    POST /jobs              {"workbook_path", "backend", "incremental", "options"} -> {"job_id", ...}
+    GET  /jobs/<id>?since=N status, phase, progress and log lines from N on
+    POST /shutdown          stop the service
+
+Jobs run one at a time, in the order they were sent.
+"""
+import argparse
+import contextlib
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from distance_engine import CentreMatcher
+from gazetteer import Gazetteer
+from geocode_cache import GeocodeCache
+from geocoder_backends import make_geocoder
+from incremental import centres_fingerprint
+from proximity_checker import CENTRE_INFO_SHEET, TOP_N, USER_INPUT_SHEET, process_workbook
+from run_metrics import RunMetrics
+from service_client import SERVICE_HOST, TOKEN_HEADER, default_token_path, service_port, stop_service
+from workbook_io import BACKENDS, DEFAULT_BACKEND, open_workbook
+
+IDLE_SHUTDOWN_MINUTES = 120
+MAX_JOBS_KEPT = 50
+MAX_MATCHERS_KEPT = 4
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm", ".xlsb", ".xls")
+
+
+def write_token(path):
+    """Write a fresh random secret to path, readable by this user only."""
+    token = secrets.token_urlsafe(32)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def check_workbook_path(workbook_path, backend):
+    """Why a job cannot run on this workbook, or None if it looks right."""
+    if backend not in BACKENDS:
+        return f"Unknown backend '{backend}'"
+    if not os.path.isabs(workbook_path):
+        return "workbook_path must be an absolute path"
+    if backend == "csv":
+        if not os.path.isdir(workbook_path):
+            return "The csv backend needs a folder"
+        for sheet in (USER_INPUT_SHEET, CENTRE_INFO_SHEET):
+            if not os.path.isfile(os.path.join(workbook_path, f"{sheet}.csv")):
+                return f"No '{sheet}.csv' in {workbook_path}"
+        return None
+    if not os.path.isfile(workbook_path):
+        return f"No workbook at {workbook_path}"
+    if not workbook_path.lower().endswith(WORKBOOK_EXTENSIONS):
+        return f"Not an Excel workbook: {workbook_path}"
+    return None
+
+
+class Job:
+    """One queued workbook run and everything it has printed so far."""
+
+    def __init__(self, job_id, workbook_path, backend, incremental, options=None):
+        self.id = job_id
+        self.workbook_path = workbook_path
+        self.backend = backend
+        self.incremental = incremental
+        self.options = options or {}
+        self.status = "queued"
+        self.error = None
+        self.log = []
+        self.metrics = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self, since=0):
+        progress = None
+        phase = None
+        if self.metrics is not None:
+            phase = self.metrics.current_phase
+            if self.metrics.progress is not None:
+                done, total = self.metrics.progress
+                progress = {"done": done, "total": total}
+
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "workbook_path": self.workbook_path,
+            "status": self.status,
+            "phase": phase,
+            "progress": progress,
+            "seconds": round(end - self.started_at, 2) if self.started_at else None,
+            "error": self.error,
+            "log": self.log[since:],
+            "next_line": len(self.log),
+        }
+
+
+class JobLog:
+    """File-like object that collects printed lines into a job's log."""
+
+    def __init__(self, job, echo=None):
+        self.job = job
+        self.echo = echo
+        self.partial = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if self.echo is not None:
+            self.echo.write(text)
+        with self._lock:
+            lines = (self.partial + text).split("\n")
+            self.partial = lines.pop()
+            self.job.log.extend(lines)
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self.partial:
+                self.job.log.append(self.partial)
+                self.partial = ""
+        if self.echo is not None:
+            self.echo.flush()
+
+
+class WarmService:
+    """Long-lived cache, client, gazetteer and centre indexes shared by every job."""
+
+    def __init__(self, geocoder=None):
+        self.cache = GeocodeCache()
+        self.client = make_geocoder(geocoder)
+        self.gazetteer = Gazetteer.open_default()
+        self.matchers = OrderedDict()
+        self.jobs = OrderedDict()
+        self.queue = queue.Queue()
+        self.job_ids = itertools.count(1)
+        self.running = None
+        self.last_activity = time.monotonic()
+        self._lock = threading.Lock()
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def matcher_for(self, centres, exact=False):
+        """Reuse the CentreMatcher (and its index) while Centre Info is unchanged."""
+        key = (centres_fingerprint(centres, TOP_N), exact)
+        with self._lock:
+            matcher = self.matchers.pop(key, None)
+        if matcher is None:
+            matcher = CentreMatcher(centres, exact=exact)
+        with self._lock:
+            self.matchers[key] = matcher
+            while len(self.matchers) > MAX_MATCHERS_KEPT:
+                self.matchers.popitem(last=False)
+        return matcher
+
+    def submit(self, workbook_path, backend=DEFAULT_BACKEND, incremental=False, options=None):
+        with self._lock:
+            job = Job(str(next(self.job_ids)), workbook_path, backend, incremental, options)
+            self.jobs[job.id] = job
+            while len(self.jobs) > MAX_JOBS_KEPT:
+                self.jobs.popitem(last=False)
+            self.last_activity = time.monotonic()
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def idle_seconds(self):
+        if self.running is not None or not self.queue.empty():
+            return 0.0
+        return time.monotonic() - self.last_activity
+
+    def _work(self):
+        # Excel is driven over COM, which needs initialising on this thread.
+        try:
+            import pythoncom
+
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            self.running = job
+            self._run(job)
+            self.running = None
+            self.last_activity = time.monotonic()
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        job.metrics = RunMetrics()
+        self.client.reset_stats()
+        log = JobLog(job, echo=sys.__stdout__)
+
+        try:
+            with contextlib.redirect_stdout(log):
+                book = open_workbook(job.workbook_path, job.backend)
+                try:
+                    process_workbook(
+                        book,
+                        job.workbook_path,
+                        self.cache,
+                        self.client,
+                        self.gazetteer,
+                        job.incremental,
+                        job.metrics,
+                        self.matcher_for,
+                        job.options,
+                    )
+                finally:
+                    book.close()
+            status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            status = "failed"
+        log.flush()
+        job.finished_at = time.time()
+        job.status = status
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join(timeout=5)
+        self.cache.close()
+        self.client.close()
+        if self.gazetteer is not None:
+            self.gazetteer.close()
+
+
+def make_handler(service, server_ref):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            encoded = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def authorised(self):
+            """Send 401 and return False unless the request carries the token."""
+            sent = self.headers.get(TOKEN_HEADER) or ""
+            if hmac.compare_digest(sent.encode("utf-8"), self.server.token.encode("utf-8")):
+                return True
+            self.send_json(401, {"error": "Missing or wrong service token"})
+            return False
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self):
+            if not self.authorised():
+                return
+            url = urlparse(self.path)
+            if url.path == "/health":
+                running = service.running
+                self.send_json(
+                    200,
+                    {
+                        "status": "ok",
+                        "running_job": running.id if running is not None else None,
+                        "queued_jobs": service.queue.qsize(),
+                        "cache_hits": service.cache.hits,
+                        "cache_misses": service.cache.misses,
+                    },
+                )
+                return
+
+            if url.path.startswith("/jobs/"):
+                job = service.get(url.path[len("/jobs/"):])
+                if job is None:
+                    self.send_json(404, {"error": "Unknown job"})
+                    return
+                try:
+                    since = int(parse_qs(url.query).get("since", ["0"])[0])
+                except ValueError:
+                    since = 0
+                self.send_json(200, job.to_dict(since))
+                return
+
+            self.send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            # Browsers can send text/plain posts to any port without asking
+            # first, so only JSON bodies are accepted.
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            if content_type != "application/json":
+                self.send_json(415, {"error": "Content-Type must be application/json"})
+                return
+            if not self.authorised():
+                return
+            url = urlparse(self.path)
+            try:
+                payload = self.read_json()
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                self.send_json(400, {"error": "Body must be a JSON object"})
+                return
+
+            if url.path == "/jobs":
+                workbook_path = payload.get("workbook_path")
+                if not isinstance(workbook_path, str) or not workbook_path:
+                    self.send_json(400, {"error": "workbook_path is required"})
+                    return
+                backend = payload.get("backend") or DEFAULT_BACKEND
+                problem = check_workbook_path(workbook_path, backend)
+                if problem is not None:
+                    self.send_json(400, {"error": problem})
+                    return
+                job = service.submit(
+                    workbook_path,
+                    backend,
+                    bool(payload.get("incremental")),
+                    payload.get("options") or {},
+                )
+                self.send_json(202, job.to_dict())
+                return
+
+            if url.path == "/shutdown":
+                self.send_json(200, {"status": "stopping"})
+                threading.Thread(target=server_ref[0].shutdown, daemon=True).start()
+                return
+
+            self.send_json(404, {"error": "Not found"})
+
+    return ServiceHandler
+
+
+def serve(port=None, geocoder=None, idle_minutes=IDLE_SHUTDOWN_MINUTES):
+    """Run the service until /shutdown is called or it has been idle too long."""
+    port = service_port(port)
+    token_path = default_token_path()
+    server_ref = [None]
+    service = WarmService(geocoder)
+
+    try:
+        server = ThreadingHTTPServer((SERVICE_HOST, port), make_handler(service, server_ref))
+    except OSError as e:
+        service.close()
+        print(f"Could not listen on port {port} (is the service already running?): {e}")
+        return
+    server.daemon_threads = True
+    server_ref[0] = server
+    # Only written once the port is ours, so a second start cannot replace
+    # the token of a service that is already running.
+    server.token = write_token(token_path)
+
+    def watch_idle():
+        while True:
+            time.sleep(30)
+            if service.idle_seconds() > idle_minutes * 60:
+                print(f"Idle for {idle_minutes} minutes, shutting down.")
+                server.shutdown()
+                return
+
+    if idle_minutes:
+        threading.Thread(target=watch_idle, daemon=True).start()
+
+    print(f"Proximity checker service listening on http://{SERVICE_HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        with contextlib.suppress(OSError):
+            os.remove(token_path)
+        print("Service stopped.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep proximity_checker warm between runs.")
+    parser.add_argument("--port", type=int, default=None, help="Port on 127.0.0.1 (default 8766).")
+    parser.add_argument("--geocoder", default=None, help="Geocoder spec, as for proximity_checker.")
+    parser.add_argument(
+        "--idle-minutes",
+        type=float,
+        default=IDLE_SHUTDOWN_MINUTES,
+        help="Stop after this long without jobs (0 keeps it running).",
+    )
+    parser.add_argument("--stop", action="store_true", help="Stop a running service and exit.")
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        print("Service stopped." if stop_service(args.port) else "No service was running.")
+        return
+    serve(args.port, args.geocoder, args.idle_minutes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Thin client for the warm proximity_checker service (see service.py).
+
+Only uses the standard library so forwarding a job costs almost nothing
+at start-up. If no service is listening, callers fall back to running
+the job in-process.
+
+Every request carries the secret the service wrote to its token file
+when it started, so only users who can read that file can send jobs.
+"""
+import json
+import os
+import sys
+import time
+import urllib.request
+
+SERVICE_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+PORT_ENV_VAR = "LOCATION_MAPPER_SERVICE_PORT"
+HEALTH_TIMEOUT_SECONDS = 0.3
+REQUEST_TIMEOUT_SECONDS = 10
+POLL_SECONDS = 0.5
+TOKEN_FILE_NAME = "service_token"
+TOKEN_HEADER = "X-Service-Token"
+
+
+def default_token_path():
+    """Keep the token next to the .exe (or the script when run from source)."""
+    if getattr(sys, "frozen", False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, TOKEN_FILE_NAME)
+
+
+def read_token(path=None):
+    """The running service's secret, or "" if there is no token file."""
+    try:
+        with open(path or default_token_path(), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def service_port(port=None):
+    return port or int(os.environ.get(PORT_ENV_VAR) or DEFAULT_PORT)
+
+
+def service_url(port=None):
+    return f"http://{SERVICE_HOST}:{service_port(port)}"
+
+
+def request_json(method, path, payload=None, port=None, timeout=REQUEST_TIMEOUT_SECONDS):
+    """Send a JSON request to the service and return the decoded reply."""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(
+        service_url(port) + path,
+        data=data,
+        method=method,
+        headers={"Content-Type": "application/json", TOKEN_HEADER: read_token()},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def service_available(port=None):
+    """True if a service answers /health on this machine."""
+    try:
+        return request_json("GET", "/health", port=port, timeout=HEALTH_TIMEOUT_SECONDS).get("status") == "ok"
+    except (OSError, ValueError):
+        return False
+
+
+def run_via_service(workbook_path, backend, incremental, port=None, options=None):
+    """
+    Hand the workbook to a running service and echo its log until it ends.
+
+    Returns None when no service is running (so the caller should run the
+    job itself), otherwise True if the job succeeded and False if it failed.
+    """
+    if not service_available(port):
+        return None
+
+    try:
+        job = request_json(
+            "POST",
+            "/jobs",
+            {
+                "workbook_path": os.path.abspath(workbook_path),
+                "backend": backend,
+                "incremental": incremental,
+                "options": options or {},
+            },
+            port=port,
+        )
+    except (OSError, ValueError):
+        return None
+
+    job_id = job["job_id"]
+    print(f"Sent to the running service (job {job_id}).")
+
+    next_line = 0
+    said_queued = False
+    while True:
+        try:
+            status = request_json("GET", f"/jobs/{job_id}?since={next_line}", port=port)
+        except (OSError, ValueError) as e:
+            print(f"Lost contact with the service: {e}")
+            return False
+
+        for line in status["log"]:
+            print(line)
+        next_line = status["next_line"]
+
+        if status["status"] == "queued" and not said_queued:
+            print("Waiting for an earlier run to finish...")
+            said_queued = True
+        if status["status"] == "done":
+            return True
+        if status["status"] == "failed":
+            print(f"Failed: {status['error']}")
+            return False
+
+        time.sleep(POLL_SECONDS)
+
+
+def stop_service(port=None):
+    """Ask a running service to shut down. Returns False if none was running."""
+    try:
+        request_json("POST", "/shutdown", {}, port=port, timeout=HEALTH_TIMEOUT_SECONDS * 10)
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,104 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from distance_engine import EARTH_RADIUS_KM, ROUNDING_SLACK_KM, haversine_rad, rank_row
+
+
+def unit_vectors(lat_rad, lon_rad):
+    """Convert radian lat/lon arrays to 3D points on the unit sphere."""
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def chord_for_km(distance_km):
+    """Straight-line distance through the unit sphere for a surface distance in km."""
+    angle = np.minimum(np.pi, np.asarray(distance_km) / EARTH_RADIUS_KM)
+    # Pad a little so float noise never drops a point sitting right on the edge.
+    return 2 * np.sin(angle / 2) * (1 + 1e-9) + 1e-12
+
+
+class CentreIndex:
+    """
+    KD-tree over centres (as 3D unit vectors) for exact k-nearest queries.
+
+    Straight-line distance between unit vectors grows with great-circle
+    distance, so the tree's nearest neighbours are the haversine nearest
+    neighbours. The returned distances are recomputed with the haversine
+    formula, so they are identical to a full scan.
+    """
+
+    def __init__(self, centre_arrays):
+        self.centres = centre_arrays
+        self.tree = cKDTree(unit_vectors(centre_arrays.lat, centre_arrays.lon))
+
+    def __len__(self):
+        return len(self.centres)
+
+    def candidates_within(self, lat_rad, lon_rad, radius_km):
+        """
+        (tutor positions, centre indices) of every centre that could be
+        within radius_km of each tutor (radian arrays in). A superset: the
+        caller checks the exact distance.
+        """
+        points = unit_vectors(lat_rad, lon_rad)
+        candidates = self.tree.query_ball_point(points, chord_for_km(radius_km))
+        counts = np.array([len(c) for c in candidates], dtype=np.intp)
+        if not counts.sum():
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        centres = np.concatenate([np.asarray(c, dtype=np.intp) for c in candidates])
+        return np.repeat(np.arange(len(points)), counts), centres
+
+    def nearest(self, tutor_lats, tutor_lons, top_n):
+        """
+        Top-N nearest centres for many tutors.
+
+        tutor_lats/tutor_lons are degrees. Returns the same format as
+        distance_engine.nearest_centres: a list (one per tutor) of
+        [(rounded_km, centre_index), ...], nearest first.
+        """
+        lat_rad = np.radians(np.asarray(tutor_lats, dtype=np.float64))
+        lon_rad = np.radians(np.asarray(tutor_lons, dtype=np.float64))
+        if len(lat_rad) == 0:
+            return []
+
+        k = min(top_n, len(self))
+        if k == 0:
+            return [[] for _ in range(len(lat_rad))]
+
+        points = unit_vectors(lat_rad, lon_rad)
+        _, neighbours = self.tree.query(points, k=k)
+        neighbours = neighbours.reshape(len(points), k)
+
+        # Exact distance to the furthest of the k neighbours, then widen by the
+        # rounding slack so every centre that could tie after rounding is kept.
+        furthest_km = haversine_rad(
+            lat_rad[:, None],
+            lon_rad[:, None],
+            self.centres.lat[neighbours],
+            self.centres.lon[neighbours],
+            self.centres.cos_lat[neighbours],
+        ).max(axis=1)
+        radii = chord_for_km(furthest_km + ROUNDING_SLACK_KM)
+        candidates = self.tree.query_ball_point(points, radii)
+
+        # Score every (tutor, candidate) pair in one vectorized call.
+        candidates = [np.sort(np.asarray(c, dtype=np.intp)) for c in candidates]
+        counts = np.array([len(c) for c in candidates])
+        flat_centres = np.concatenate(candidates)
+        flat_tutors = np.repeat(np.arange(len(points)), counts)
+        flat_km = haversine_rad(
+            lat_rad[flat_tutors],
+            lon_rad[flat_tutors],
+            self.centres.lat[flat_centres],
+            self.centres.lon[flat_centres],
+            self.centres.cos_lat[flat_centres],
+        )
+
+        results = []
+        start = 0
+        for candidate_indices, count in zip(candidates, counts):
+            distances = flat_km[start:start + count]
+            start += count
+            ranked = rank_row(distances, range(count), top_n)
+            results.append([(km, int(candidate_indices[j])) for km, j in ranked])
+        return results
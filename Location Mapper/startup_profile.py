@@ -0,0 +1,59 @@
+"""
+Start-up cost report for --profile-startup.
+
+The entry scripts only import the standard library and this project's
+light modules at start-up; NumPy, requests and the workbook backend are
+loaded the first time they are needed. This report shows how long that
+first part took and what each deferred import costs, so a slow click can
+be traced to its cause.
+"""
+import importlib
+import sys
+import time
+
+HEAVY_MODULES = ("numpy", "scipy", "requests", "xlwings", "openpyxl", "pyarrow")
+BACKEND_MODULES = {"xlwings": "xlwings", "openpyxl": "openpyxl", "csv": None}
+
+
+def backend_step(backend):
+    return (f"workbook backend ({backend})", BACKEND_MODULES.get(backend))
+
+
+def time_import(module_name):
+    """Seconds to import module_name now (near zero if it was already loaded)."""
+    started = time.perf_counter()
+    importlib.import_module(module_name)
+    return time.perf_counter() - started
+
+
+def print_startup_profile(tool, steps):
+    """
+    steps is a list of (label, module name) in the order a run needs them.
+    A module name of None means the step needs no extra import.
+    """
+    preloaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    # CPU time covers interpreter start-up plus the entry script's imports.
+    startup_ms = time.process_time() * 1000
+
+    print(f"Start-up profile for {tool}")
+    print(f"  {'Interpreter + entry script (CPU time)':<48} {startup_ms:>8.0f} ms")
+    print("  Imported only when a run needs them:")
+
+    total_ms = 0.0
+    for label, module_name in steps:
+        if module_name is None:
+            print(f"    {label:<46} {'-':>8}")
+            continue
+        try:
+            seconds = time_import(module_name)
+        except ImportError as e:
+            print(f"    {label:<46} {'missing':>8}  ({e})")
+            continue
+        total_ms += seconds * 1000
+        print(f"    {label:<46} {seconds * 1000:>8.0f} ms")
+
+    print(f"  {'Deferred imports in total':<48} {total_ms:>8.0f} ms")
+    if preloaded:
+        print(f"  Heavy modules already loaded at start-up: {', '.join(preloaded)}")
+    else:
+        print("  Heavy modules already loaded at start-up: none")
@@ -0,0 +1,318 @@
+"""
+Streaming file-to-file proximity matching for inputs too big for Excel.
+
+Usage: python stream_matcher.py tutors.csv centres.csv output.csv [--chunk-rows 5000] [--engine tiled --workers 8]
+
+Tutors are read, geocoded, matched and written one chunk at a time, so
+memory stays flat no matter how many rows the input has. CSV and Parquet
+(.parquet, needs pyarrow) are supported for every file.
+
+With --radius KM the output has one (tutor, centre, distance) row per
+centre within KM instead of the Top 3, and the count per tutor goes to
+a second file next to it (results_counts.csv for results.csv).
+
+With --coverage [KM ...] two more files are written alongside:
+results_coverage.csv (tutors per centre within each band, nearest and
+median tutor distance) and results_unserved.csv.
+"""
+import argparse
+import csv
+import os
+
+from distance_engine import ENGINES, TILE_MEMORY_MB, CentreMatcher
+from gazetteer import Gazetteer
+from geocode_cache import GeocodeCache
+from geocoder_backends import make_geocoder
+from geocoding import count_failures, geocode_many, print_client_stats, report_failures
+from postal_validation import count_rejections, report_rejections
+from centre_coverage import DEFAULT_BANDS_KM, UNSERVED_HEADERS, CoverageStats, add_tutors, coverage_headers
+from proximity_checker import OUTPUT_HEADERS, centres_from_rows, lookup_codes, match_centres, tutors_from_rows
+from radius_search import RADIUS_HEADERS, count_headers, radius_results
+
+CHUNK_ROWS = 5000
+
+
+def is_parquet(path):
+    return path.lower().endswith(".parquet")
+
+
+def iter_row_chunks(path, chunk_rows, columns):
+    """
+    Yield lists of rows (first `columns` values each) from a CSV or Parquet
+    file, chunk_rows at a time. The header line/schema is skipped.
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        names = parquet_file.schema_arrow.names[:columns]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=names):
+            data = [batch.column(i).to_pylist() for i in range(len(names))]
+            yield [list(row) for row in zip(*data)]
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        chunk = []
+        for row in reader:
+            row = [value if value != "" else None for value in row[:columns]]
+            row.extend([None] * (columns - len(row)))
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class ResultWriter:
+    """Append output rows to a CSV or Parquet file as they are produced."""
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = headers
+        self.rows_written = 0
+
+        if is_parquet(path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self.pa = pa
+            fields = []
+            for header in headers:
+                if "(km)" in header:
+                    kind = pa.float64()
+                elif header.startswith(("Tutors within", "Centres within")):
+                    kind = pa.int64()
+                else:
+                    kind = pa.string()
+                fields.append(pa.field(header, kind))
+            self.schema = pa.schema(fields)
+            self.writer = pq.ParquetWriter(path, self.schema)
+            self.file = None
+        else:
+            self.writer = None
+            self.file = open(path, "w", newline="", encoding="utf-8")
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(headers)
+
+    def write(self, rows):
+        if not rows:
+            return
+
+        if self.writer is not None:
+            columns = []
+            for i, field in enumerate(self.schema):
+                values = [row[i] for row in rows]
+                if field.type == self.pa.string():
+                    values = [None if value is None else str(value) for value in values]
+                elif field.type == self.pa.int64():
+                    # Text such as "Postal code not found" has no place in a
+                    # count column, so those tutors get an empty count.
+                    values = [None if isinstance(value, str) else value for value in values]
+                columns.append(values)
+            self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        else:
+            self.csv_writer.writerows(["" if value is None else value for value in row] for row in rows)
+            self.file.flush()
+
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+
+
+def sibling_path(output_path, suffix):
+    """results.csv -> results_<suffix>.csv"""
+    root, extension = os.path.splitext(output_path)
+    return f"{root}_{suffix}{extension}"
+
+
+def read_all_centres(centres_path):
+    """Centres are small compared to tutors, so they are loaded in full."""
+    centres = []
+    for chunk in iter_row_chunks(centres_path, CHUNK_ROWS, 4):
+        centres.extend(centres_from_rows(chunk))
+    return centres
+
+
+def run_stream(
+    tutors_path,
+    centres_path,
+    output_path,
+    chunk_rows=CHUNK_ROWS,
+    geocoder=None,
+    engine="auto",
+    workers=None,
+    memory_mb=TILE_MEMORY_MB,
+    radius_km=None,
+    exact=False,
+    coverage_bands_km=None,
+    unserved_km=None,
+):
+    """
+    Match every tutor in tutors_path against centres_path, chunk by chunk.
+    With radius_km, list every centre within that distance instead. With
+    coverage_bands_km, also write the coverage and unserved files.
+    """
+    centres = read_all_centres(centres_path)
+    print(f"Loaded {len(centres)} centres.")
+    matcher = CentreMatcher(centres, engine, workers, memory_mb, exact)
+
+    cache = GeocodeCache()
+    client = make_geocoder(geocoder)
+    gazetteer = Gazetteer.open_default()
+    counts_writer = None
+    if radius_km is None:
+        writer = ResultWriter(output_path, OUTPUT_HEADERS)
+    else:
+        writer = ResultWriter(output_path, RADIUS_HEADERS)
+        counts_writer = ResultWriter(sibling_path(output_path, "counts"), count_headers(radius_km))
+    coverage = None
+    unserved_writer = None
+    if coverage_bands_km is not None:
+        coverage = CoverageStats(matcher.centre_arrays, coverage_bands_km or DEFAULT_BANDS_KM, unserved_km)
+        unserved_writer = ResultWriter(sibling_path(output_path, "unserved"), UNSERVED_HEADERS)
+    rejections = {}
+    failures = {}
+
+    try:
+        for chunk in iter_row_chunks(tutors_path, chunk_rows, 2):
+            tutors = tutors_from_rows(chunk)
+            for reason, count in count_rejections(tutor["reason"] for tutor in tutors).items():
+                rejections[reason] = rejections.get(reason, 0) + count
+            coordinates = geocode_many(
+                lookup_codes(tutors),
+                cache=cache,
+                client=client,
+                gazetteer=gazetteer,
+                report=False,
+            )
+            for category, count in count_failures(coordinates).items():
+                failures[category] = failures.get(category, 0) + count
+            if counts_writer is None:
+                writer.write(match_centres(tutors, coordinates, centres, matcher))
+                print(f"Processed {writer.rows_written} tutors.")
+            else:
+                pair_rows, count_rows = radius_results(tutors, coordinates, matcher, radius_km)
+                writer.write(pair_rows)
+                counts_writer.write(count_rows)
+                print(
+                    f"Processed {counts_writer.rows_written} tutors "
+                    f"({writer.rows_written} pairs within {radius_km:g} km)."
+                )
+            if coverage is not None:
+                add_tutors(coverage, tutors, coordinates)
+                unserved_writer.write(coverage.unserved)
+                coverage.unserved = []
+
+        if coverage is not None:
+            coverage_writer = ResultWriter(sibling_path(output_path, "coverage"), coverage_headers(coverage.bands_km))
+            coverage_writer.write(coverage.coverage_rows())
+            coverage_writer.close()
+            print(
+                f"Coverage: {unserved_writer.rows_written} of {coverage.tutors} located tutors have no centre "
+                f"within {coverage.unserved_km:g} km."
+            )
+
+        report_rejections(rejections)
+        report_failures(failures)
+        print(f"Geocode cache: {cache.hits} hits, {cache.misses} misses.")
+        print_client_stats(client)
+        print(f"Done. Results written to {os.path.abspath(output_path)}")
+    finally:
+        writer.close()
+        if counts_writer is not None:
+            counts_writer.close()
+        if unserved_writer is not None:
+            unserved_writer.close()
+        cache.close()
+        client.close()
+        if gazetteer is not None:
+            gazetteer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream tutors through proximity matching, file to file.")
+    parser.add_argument("tutors_path", help="CSV/Parquet with tutor name and postal code as the first two columns.")
+    parser.add_argument(
+        "centres_path",
+        help="CSV/Parquet laid out like Centre Info: name, postal code, latitude, longitude.",
+    )
+    parser.add_argument("output_path", help="Where to write results (.csv or .parquet).")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Tutors processed per chunk.")
+    parser.add_argument(
+        "--geocoder",
+        default=None,
+        help="onemap (default), onemap:<url>, table:<csv>, record:<json> or replay:<json>.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="auto",
+        help="How centres are searched: auto (default), scan, index (KD-tree) or tiled.",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Threads for --engine tiled (default: all cores).")
+    parser.add_argument(
+        "--memory-mb",
+        type=float,
+        default=TILE_MEMORY_MB,
+        help=f"Cap on working memory for --engine tiled (default {TILE_MEMORY_MB}).",
+    )
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=None,
+        metavar="KM",
+        help="Write every centre within KM of each tutor (long format) instead of the Top 3.",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Run the full Haversine formula on every pair (slower; for auditing the results).",
+    )
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        nargs="*",
+        default=None,
+        metavar="KM",
+        help="Also write per-centre coverage for these distance bands (default 1 3 5 km) and the unserved tutors.",
+    )
+    parser.add_argument(
+        "--unserved-km",
+        type=float,
+        default=None,
+        metavar="KM",
+        help="With --coverage: tutors with no centre within KM are unserved (default: the largest band).",
+    )
+    args = parser.parse_args(argv)
+    if args.chunk_rows < 1:
+        parser.error("--chunk-rows must be at least 1")
+    if args.coverage is not None and any(band <= 0 for band in args.coverage):
+        parser.error("--coverage bands must be more than 0")
+    if args.radius is not None and args.radius <= 0:
+        parser.error("--radius must be more than 0")
+
+    run_stream(
+        args.tutors_path,
+        args.centres_path,
+        args.output_path,
+        args.chunk_rows,
+        args.geocoder,
+        args.engine,
+        args.workers,
+        args.memory_mb,
+        args.radius,
+        args.exact,
+        args.coverage,
+        args.unserved_km,
+    )
+
+
+if __name__ == "__main__":
+    main()
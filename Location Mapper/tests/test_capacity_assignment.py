@@ -0,0 +1,127 @@
+import random
+
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from capacity_assignment import solve_assignment
+
+
+def reference_optimum(candidates, costs, counts, capacities):
+    """
+    (tutors assigned, total cost) from linear_sum_assignment, with every
+    tutor and every centre place as its own row or column.
+    """
+    tutors = [group for group, count in enumerate(counts) for _ in range(count)]
+    slots = []
+    for centre, capacity in enumerate(capacities):
+        slots.extend([centre] * (len(tutors) if capacity is None else capacity))
+
+    # Leaving a tutor out costs more than any set of assignments, so the
+    # number assigned is maximised first and the distance second.
+    drop = sum(max(row, default=0) for row in costs) * len(tutors) + 1
+    forbidden = drop * (len(tutors) + 1)
+    matrix = np.full((len(tutors), len(slots) + len(tutors)), forbidden, dtype=np.int64)
+    for row, group in enumerate(tutors):
+        cost_by_centre = dict(zip(candidates[group], costs[group]))
+        for column, centre in enumerate(slots):
+            if centre in cost_by_centre:
+                matrix[row, column] = cost_by_centre[centre]
+        matrix[row, len(slots) + row] = drop
+
+    rows, columns = linear_sum_assignment(matrix)
+    assigned = int(sum(1 for column in columns if column < len(slots)))
+    total = int(sum(matrix[r, c] for r, c in zip(rows, columns) if c < len(slots)))
+    return assigned, total
+
+
+def check_solution(candidates, costs, counts, capacities, taken):
+    """Check taken is feasible and return (tutors assigned, total cost)."""
+    load = [0] * len(capacities)
+    assigned = 0
+    total = 0
+    for group, places in enumerate(taken):
+        assert len(places) == len(candidates[group])
+        assert all(count >= 0 for count in places)
+        assert sum(places) <= counts[group]
+        for centre, cost, count in zip(candidates[group], costs[group], places):
+            load[centre] += count
+            total += cost * count
+        assigned += sum(places)
+    for capacity, count in zip(capacities, load):
+        if capacity is not None:
+            assert count <= capacity
+    return assigned, total
+
+
+def random_instance(rng, max_groups=6, max_centres=4, max_cost=6):
+    n_centres = rng.randint(1, max_centres)
+    n_groups = rng.randint(1, max_groups)
+    k = rng.randint(1, n_centres)
+    candidates = []
+    costs = []
+    for _ in range(n_groups):
+        centres = rng.sample(range(n_centres), k)
+        # A small cost range gives plenty of ties; candidates are nearest first.
+        row = sorted(rng.randint(0, max_cost) for _ in centres)
+        candidates.append(centres)
+        costs.append(row)
+    counts = [rng.randint(1, 3) for _ in range(n_groups)]
+    capacities = [rng.choice([None, 0, 1, 1, 2, 3, 5]) for _ in range(n_centres)]
+    return candidates, costs, counts, capacities
+
+
+def assert_optimal(candidates, costs, counts, capacities):
+    taken = solve_assignment(candidates, costs, counts, capacities)
+    solved = check_solution(candidates, costs, counts, capacities, taken)
+    assert solved == reference_optimum(candidates, costs, counts, capacities)
+    return taken
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_linear_sum_assignment_on_random_instances(seed):
+    assert_optimal(*random_instance(random.Random(seed)))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_linear_sum_assignment_on_larger_instances(seed):
+    assert_optimal(*random_instance(random.Random(1000 + seed), max_groups=15, max_centres=7, max_cost=20))
+
+
+def test_capacity_above_one_takes_the_whole_group():
+    taken = assert_optimal([[0, 1]], [[1, 5]], [3], [3, None])
+    assert taken == [[3, 0]]
+
+
+def test_overflow_moves_to_the_cheapest_alternative():
+    # Both groups prefer centre 0, which only has room for two tutors.
+    # Moving group 1 costs 1 per tutor, moving group 0 costs 4.
+    taken = assert_optimal([[0, 1], [0, 1]], [[1, 5], [2, 3]], [2, 2], [2, 2])
+    assert taken == [[2, 0], [0, 2]]
+
+
+def test_chain_of_moves_frees_a_place():
+    # Group 0 can only use centre 0, so group 1 has to move on to centre 1.
+    taken = assert_optimal([[0], [0, 1]], [[1], [1, 2]], [1, 1], [1, 1])
+    assert taken == [[1], [0, 1]]
+
+
+def test_capacity_below_demand_leaves_tutors_unassigned():
+    taken = assert_optimal([[0, 1], [1, 0]], [[1, 2], [1, 2]], [3, 2], [1, 2])
+    assert sum(map(sum, taken)) == 3
+
+
+def test_assigning_more_tutors_beats_a_shorter_total():
+    # Sending group 0 to its far centre lets group 1 in as well.
+    taken = assert_optimal([[0, 1], [0]], [[1, 50], [1]], [1, 1], [1, 1])
+    assert taken == [[0, 1], [1]]
+
+
+def test_ties_keep_the_optimal_total():
+    taken = assert_optimal([[0, 1], [0, 1], [1, 0]], [[2, 2], [2, 2], [2, 2]], [2, 2, 2], [3, 3])
+    assert sum(map(sum, taken)) == 6
+
+
+def test_zero_capacity_and_unlimited_centres():
+    taken = assert_optimal([[0, 1, 2], [2, 1]], [[0, 1, 9], [3, 4]], [2, 2], [0, None, 1])
+    assert taken == [[0, 2, 0], [1, 1]]
@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+import pytest
+
+import distance_engine
+from distance_engine import (
+    APPROX_MAX_ABS_LAT_RAD,
+    APPROX_MAX_SPAN_RAD,
+    CentreArrays,
+    approximation_bound,
+    haversine_block,
+    nearest_centres,
+    top_n_block,
+    top_n_block_approx,
+)
+
+
+def random_points(rng, count, mid_lat, span_deg):
+    lats = mid_lat + rng.uniform(-span_deg / 2, span_deg / 2, count)
+    lons = 103.8 + rng.uniform(-span_deg / 2, span_deg / 2, count)
+    return lats, lons
+
+
+def make_centres(lats, lons):
+    return CentreArrays([{"name": f"C{i}", "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(zip(lats, lons))])
+
+
+def exact_results(lats, lons, centre_arrays, top_n):
+    return top_n_block(haversine_block(np.radians(lats), np.radians(lons), centre_arrays), top_n)
+
+
+@pytest.mark.parametrize("mid_lat", [0.0, 1.35, -1.35, 25.0, 45.0, -50.0, 57.0])
+@pytest.mark.parametrize("span_deg", [0.01, 0.1, 0.5, 1.5, 2.5])
+@pytest.mark.parametrize("seed", range(3))
+def test_approximate_pass_matches_exact_ranking(mid_lat, span_deg, seed):
+    rng = np.random.default_rng(seed)
+    centre_lats, centre_lons = random_points(rng, 300, mid_lat, span_deg)
+    # A few repeated centres give exact ties, kept in Centre Info order.
+    centre_lats[::25] = centre_lats[0]
+    centre_lons[::25] = centre_lons[0]
+    centre_arrays = make_centres(centre_lats, centre_lons)
+    lats, lons = random_points(rng, 400, mid_lat, span_deg)
+
+    bound = approximation_bound(np.radians(lats), np.radians(lons), centre_arrays)
+    assert bound is not None
+    for top_n in (1, 3, 10):
+        approx = top_n_block_approx(np.radians(lats), np.radians(lons), centre_arrays, top_n, bound)
+        assert approx == exact_results(lats, lons, centre_arrays, top_n)
+
+
+@pytest.mark.parametrize("mid_lat", [1.35, 40.0])
+def test_approximate_pass_matches_exact_on_a_grid_of_ties(mid_lat):
+    # Tutors and centres on one grid: many distances are equal, or only
+    # differ past the second decimal.
+    steps = np.arange(12) * 0.004
+    grid_lats, grid_lons = np.meshgrid(mid_lat + steps, 103.8 + steps)
+    centre_arrays = make_centres(grid_lats.ravel()[::3], grid_lons.ravel()[::3])
+    lats, lons = grid_lats.ravel(), grid_lons.ravel()
+
+    approx = nearest_centres(lats, lons, centre_arrays, 5)
+    exact = nearest_centres(lats, lons, centre_arrays, 5, exact=True)
+    assert approx == exact
+
+
+def test_nearest_centres_uses_the_approximate_pass_in_singapore(monkeypatch):
+    rng = np.random.default_rng(7)
+    centre_arrays = make_centres(*random_points(rng, 50, 1.35, 0.3))
+    lats, lons = random_points(rng, 200, 1.35, 0.3)
+    calls = []
+    original = distance_engine.top_n_block_approx
+
+    def counting(*args):
+        calls.append(1)
+        return original(*args)
+
+    monkeypatch.setattr(distance_engine, "top_n_block_approx", counting)
+    assert nearest_centres(lats, lons, centre_arrays, 3) == nearest_centres(lats, lons, centre_arrays, 3, exact=True)
+    assert calls
+
+
+@pytest.mark.parametrize(
+    "mid_lat, span_deg",
+    [
+        (1.35, math.degrees(APPROX_MAX_SPAN_RAD) * 1.5),
+        (1.35, 20.0),
+        (math.degrees(APPROX_MAX_ABS_LAT_RAD) + 1, 0.5),
+        (-70.0, 0.5),
+    ],
+)
+def test_falls_back_to_exact_outside_the_bound(monkeypatch, mid_lat, span_deg):
+    rng = np.random.default_rng(3)
+    centre_arrays = make_centres(*random_points(rng, 80, mid_lat, span_deg))
+    lats, lons = random_points(rng, 120, mid_lat, span_deg)
+    assert approximation_bound(np.radians(lats), np.radians(lons), centre_arrays) is None
+
+    def unused(*args):
+        raise AssertionError("the approximate pass should not run outside its bound")
+
+    monkeypatch.setattr(distance_engine, "top_n_block_approx", unused)
+    assert nearest_centres(lats, lons, centre_arrays, 3) == exact_results(lats, lons, centre_arrays, 3)
+
+
+def test_one_far_tutor_sends_only_its_block_to_the_exact_path():
+    rng = np.random.default_rng(5)
+    centre_arrays = make_centres(*random_points(rng, 40, 1.35, 0.3))
+    lats, lons = random_points(rng, 30, 1.35, 0.3)
+    lats[-1], lons[-1] = 10.0, 110.0
+    block = len(centre_arrays) * 10
+    approx = nearest_centres(lats, lons, centre_arrays, 3, block_elements=block)
+    assert approx == nearest_centres(lats, lons, centre_arrays, 3, exact=True)
@@ -0,0 +1,289 @@
+import csv
+import os
+
+BACKENDS = ("xlwings", "openpyxl", "csv")
+DEFAULT_BACKEND = "xlwings"
+EXCEL_MAX_ROWS = 1_048_576
+
+
+class XlwingsBook:
+    """Live Excel workbook through xlwings (attaches to it if it is already open)."""
+
+    max_rows = EXCEL_MAX_ROWS
+
+    def __init__(self, workbook_path):
+        self.book, self.should_close = get_open_book_by_fullname(workbook_path)
+
+    def sheet_names(self):
+        return [sheet.name for sheet in self.book.sheets]
+
+    def ensure_sheet(self, sheet):
+        if sheet not in self.sheet_names():
+            self.book.sheets.add(sheet, after=self.book.sheets[-1])
+
+    def last_row(self, sheet, col):
+        ws = self.book.sheets[sheet]
+        return ws.range((ws.cells.last_cell.row, col)).end("up").row
+
+    def last_column(self, sheet, row):
+        return self.book.sheets[sheet].used_range.last_cell.column
+
+    def read_range(self, sheet, first_row, first_col, last_row, last_col):
+        ws = self.book.sheets[sheet]
+        return ws.range((first_row, first_col), (last_row, last_col)).options(ndim=2).value
+
+    def write_range(self, sheet, first_row, first_col, rows):
+        if rows:
+            self.book.sheets[sheet].range((first_row, first_col)).value = rows
+
+    def clear_range(self, sheet, first_row, first_col, last_row, last_col):
+        ws = self.book.sheets[sheet]
+        ws.range((first_row, first_col), (last_row, last_col)).clear_contents()
+
+    def save(self):
+        self.book.save()
+
+    def close(self):
+        if self.should_close:
+            app = self.book.app
+            self.book.close()
+            app.quit()
+
+
+class OpenpyxlBook:
+    """Workbook file read and written with openpyxl, no Excel needed."""
+
+    max_rows = EXCEL_MAX_ROWS
+
+    def __init__(self, workbook_path):
+        from openpyxl import load_workbook
+
+        self.path = workbook_path
+        self.book = load_workbook(workbook_path, keep_vba=workbook_path.lower().endswith(".xlsm"))
+
+    def sheet_names(self):
+        return list(self.book.sheetnames)
+
+    def ensure_sheet(self, sheet):
+        if sheet not in self.book.sheetnames:
+            self.book.create_sheet(sheet)
+
+    def last_row(self, sheet, col):
+        ws = self.book[sheet]
+        for row in range(ws.max_row, 0, -1):
+            if ws.cell(row=row, column=col).value not in (None, ""):
+                return row
+        return 1
+
+    def last_column(self, sheet, row):
+        return self.book[sheet].max_column
+
+    def read_range(self, sheet, first_row, first_col, last_row, last_col):
+        ws = self.book[sheet]
+        return [
+            list(row)
+            for row in ws.iter_rows(
+                min_row=first_row,
+                max_row=last_row,
+                min_col=first_col,
+                max_col=last_col,
+                values_only=True,
+            )
+        ]
+
+    def write_range(self, sheet, first_row, first_col, rows):
+        ws = self.book[sheet]
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                ws.cell(row=first_row + r, column=first_col + c, value=value)
+
+    def clear_range(self, sheet, first_row, first_col, last_row, last_col):
+        ws = self.book[sheet]
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                ws.cell(row=row, column=col).value = None
+
+    def save(self):
+        self.book.save(self.path)
+
+    def close(self):
+        self.book.close()
+
+
+class CsvBook:
+    """
+    Sheets stored as CSV files.
+
+    The path is either a folder (each "<sheet name>.csv" is one sheet) or a
+    single .csv file (one sheet). The first CSV line is the header, which
+    sits on header_row in the Excel layout, so row numbers line up with
+    the workbook version.
+    """
+
+    # A CSV file has no row limit.
+    max_rows = None
+
+    def __init__(self, path, header_row=5):
+        self.header_row = header_row
+        self.sheets = {}
+        self.dirty = set()
+
+        if os.path.isdir(path):
+            self.folder = path
+            self.files = {
+                os.path.splitext(name)[0]: os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.lower().endswith(".csv")
+            }
+        else:
+            self.folder = os.path.dirname(path)
+            self.files = {os.path.splitext(os.path.basename(path))[0]: path}
+
+    def _rows(self, sheet):
+        if sheet not in self.sheets:
+            path = self.files.get(sheet)
+            if path is None:
+                path = os.path.join(self.folder, f"{sheet}.csv")
+                self.files[sheet] = path
+            rows = []
+            if os.path.exists(path):
+                with open(path, newline="", encoding="utf-8-sig") as f:
+                    rows = [[value if value != "" else None for value in row] for row in csv.reader(f)]
+            self.sheets[sheet] = rows
+        return self.sheets[sheet]
+
+    def _index(self, row):
+        return row - self.header_row
+
+    def sheet_names(self):
+        return list(self.files)
+
+    def ensure_sheet(self, sheet):
+        if sheet not in self.files:
+            self._rows(sheet)
+            self.dirty.add(sheet)
+
+    def last_row(self, sheet, col):
+        rows = self._rows(sheet)
+        for index in range(len(rows) - 1, -1, -1):
+            row = rows[index]
+            if col - 1 < len(row) and row[col - 1] not in (None, ""):
+                return index + self.header_row
+        return 1
+
+    def last_column(self, sheet, row):
+        return max((len(r) for r in self._rows(sheet)), default=0)
+
+    def read_range(self, sheet, first_row, first_col, last_row, last_col):
+        rows = self._rows(sheet)
+        block = []
+        for row in range(first_row, last_row + 1):
+            index = self._index(row)
+            values = rows[index] if 0 <= index < len(rows) else []
+            block.append(
+                [values[col - 1] if col - 1 < len(values) else None for col in range(first_col, last_col + 1)]
+            )
+        return block
+
+    def write_range(self, sheet, first_row, first_col, rows):
+        data = self._rows(sheet)
+        for r, values in enumerate(rows):
+            index = self._index(first_row + r)
+            if index < 0:
+                continue
+            while len(data) <= index:
+                data.append([])
+            row = data[index]
+            needed = first_col - 1 + len(values)
+            if len(row) < needed:
+                row.extend([None] * (needed - len(row)))
+            row[first_col - 1:needed] = values
+        self.dirty.add(sheet)
+
+    def clear_range(self, sheet, first_row, first_col, last_row, last_col):
+        width = last_col - first_col + 1
+        self.write_range(sheet, first_row, first_col, [[None] * width for _ in range(first_row, last_row + 1)])
+        data = self._rows(sheet)
+        while data and all(value in (None, "") for value in data[-1]):
+            data.pop()
+
+    def save(self):
+        for sheet in self.dirty:
+            with open(self.files[sheet], "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(["" if value is None else value for value in row] for row in self.sheets[sheet])
+        self.dirty.clear()
+
+    def close(self):
+        pass
+
+
+def get_open_book_by_fullname(workbook_path):
+    """Try to attach to a workbook that is already open in Excel."""
+    import xlwings as xw
+
+    normalized_target = workbook_path.lower()
+
+    for app in xw.apps:
+        for book in app.books:
+            try:
+                if book.fullname and book.fullname.lower() == normalized_target:
+                    return book, False
+            except Exception:
+                continue
+
+    app = xw.App(visible=False, add_book=False)
+    app.display_alerts = False
+    app.screen_updating = False
+    book = app.books.open(workbook_path)
+    return book, True
+
+
+def open_workbook(path, backend=DEFAULT_BACKEND):
+    """Open a workbook with the chosen backend ("xlwings", "openpyxl" or "csv")."""
+    if backend == "xlwings":
+        return XlwingsBook(path)
+    if backend == "openpyxl":
+        return OpenpyxlBook(path)
+    if backend == "csv":
+        return CsvBook(path)
+    raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}.")
+
+
+def read_block(book, sheet, first_row, first_col, last_col, key_col=None):
+    """
+    Read rows from first_row down to the last non-empty cell in key_col
+    (first_col by default). Returns a list of row lists.
+    """
+    last_row = book.last_row(sheet, key_col or first_col)
+    if last_row < first_row:
+        return []
+    return book.read_range(sheet, first_row, first_col, last_row, last_col)
+
+
+def write_sheet(book, sheet, header_row, headers, rows):
+    """
+    Replace a whole table: headers on header_row and rows below it.
+
+    The sheet is added if the workbook doesn't have it yet. Rows past the
+    backend's row limit are left out; returns how many rows were written.
+    """
+    book.ensure_sheet(sheet)
+    first_row = header_row + 1
+    last_used_row = book.last_row(sheet, 1)
+    if last_used_row >= header_row:
+        book.clear_range(sheet, header_row, 1, last_used_row, max(len(headers), book.last_column(sheet, header_row)))
+
+    if book.max_rows is not None and header_row + len(rows) > book.max_rows:
+        rows = rows[: book.max_rows - header_row]
+    book.write_range(sheet, header_row, 1, [headers])
+    book.write_range(sheet, first_row, 1, rows)
+    return len(rows)
+
+
+def read_header(book, sheet, row):
+    """Read a header row as a list of stripped strings."""
+    last_col = book.last_column(sheet, row)
+    if last_col < 1:
+        return []
+    values = book.read_range(sheet, row, 1, row, last_col)[0]
+    return [str(h).strip() if h is not None else "" for h in values]